@@ -0,0 +1,157 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Benchmark of show_batch against a loop of show() calls
+
+    python benchmarks/bench_batch.py --out batch.json
+    python benchmarks/bench_batch.py --scenes 64 --parts 20 --workers 8
+
+Every scene is a build123d_distinct model with --parts parts, all scenes are
+different shapes. The scenes are serialized with
+
+    loop          one show() call per scene, one after the other
+    threads       show_batch(..., parallel=False)
+    pool          show_batch(...) with the worker pool of ocp_vscode.pool
+
+from a cold cache. The pool is started before the timing. The results have the
+format of bench_show.py, see compare.py to compare runs.
+"""
+
+import argparse
+import datetime
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+
+import orjson
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+from ocp_tessellate.tessellator import cache as tessellator_cache
+
+from ocp_vscode import Serializer, clear_cache, show_batch, shutdown_pool, start_pool
+
+from bench_show import PARAMS, _git_commit, _version
+from models import build123d_distinct
+
+
+def make_scenes(count, parts):
+    # one model, split into scenes, so that no shape is shared between scenes
+    objs = build123d_distinct(count * parts)
+    return [objs[i * parts : (i + 1) * parts] for i in range(count)]
+
+
+def _loop(scenes, workers):  # pylint: disable=unused-argument
+    for scene in scenes:
+        Serializer().show(*scene, progress=None, **PARAMS)
+
+
+def _batch(scenes, workers, parallel):
+    for result in show_batch(
+        [{"cad_objs": scene} for scene in scenes],
+        workers=workers,
+        parallel=parallel,
+        **PARAMS,
+    ):
+        if result.error is not None:
+            raise result.error
+
+
+STAGES = {
+    "loop": _loop,
+    "threads": lambda scenes, workers: _batch(scenes, workers, False),
+    "pool": lambda scenes, workers: _batch(scenes, workers, True),
+}
+
+
+def run_stages(scenes, workers):
+    """Time all stages once from a cold cache, return {stage: seconds}"""
+    times = {}
+    for stage, func in STAGES.items():
+        tessellator_cache.clear()
+        clear_cache()
+        start = time.perf_counter()
+        func(scenes, workers)
+        times[stage] = time.perf_counter() - start
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scenes", type=int, default=32)
+    parser.add_argument("--parts", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="batch_results.json")
+    args = parser.parse_args(argv)
+
+    scenes = make_scenes(args.scenes, args.parts)
+    start_pool(args.processes)
+    try:
+        runs = [run_stages(scenes, args.workers) for _ in range(args.repeat)]
+    finally:
+        shutdown_pool()
+
+    name = f"{args.scenes}x{args.parts}"
+    results = []
+    for stage in STAGES:
+        times = [run[stage] for run in runs]
+        results.append(
+            {
+                "model": name,
+                "parts": args.scenes * args.parts,
+                "stage": stage,
+                "times": times,
+                "min": min(times),
+                "median": statistics.median(times),
+            }
+        )
+
+    loop = max(results[0]["min"], 1e-9)
+    for result in results:
+        print(
+            f"{name:10s} {result['stage']:8s} min {result['min']:8.3f}s  "
+            f"median {result['median']:8.3f}s  {loop / result['min']:5.2f}x loop"
+        )
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": multiprocessing.cpu_count(),
+            "ocp_vscode": _version("ocp_vscode"),
+            "ocp_tessellate": _version("ocp_tessellate"),
+            "repeat": args.repeat,
+            "workers": args.workers,
+            "processes": args.processes,
+            "params": PARAMS,
+        },
+        "results": results,
+    }
+    with open(args.out, "wb") as fd:
+        fd.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
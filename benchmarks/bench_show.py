@@ -0,0 +1,215 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Benchmarks of the stages of the show() pipeline
+
+    python benchmarks/bench_show.py --out results.json
+    python benchmarks/bench_show.py --models build123d_distinct --sizes 1 10 100
+
+Every stage is timed separately with the caches of ocp_tessellate cleared:
+
+    to_assembly           cad objects -> part group
+    tessellate_group      part group -> instances, shapes tree, states
+    combined_bb           bounding box of the shapes tree
+    numpy_to_buffer_json  hex encoding of the buffers
+    orjson.dumps          serialization of the payload
+    show                  the whole show() call (from a cold cache)
+
+The distinct models with 10,000 parts take several minutes per run. Models that
+cannot be created, e.g. when CadQuery is not installed or an example needs a
+newer build123d, are skipped. The results are written as JSON, see compare.py to
+compare two runs.
+"""
+
+import argparse
+import datetime
+import importlib.metadata
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import orjson
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position
+import ocp_tessellate
+from ocp_tessellate.convert import combined_bb, tessellate_group, to_assembly
+from ocp_tessellate.tessellator import cache as tessellator_cache
+from ocp_tessellate.utils import numpy_to_buffer_json
+
+from ocp_vscode import clear_cache, show
+from ocp_vscode.cache import copy_tree
+
+from models import EXAMPLE_FILES, SYNTHETIC, example_objects
+
+SIZES = [1, 10, 100, 1000, 10000]
+
+PARAMS = {"deviation": 0.1, "angular_tolerance": 0.2, "render_edges": True}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _version(package):
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def _unwrap(part_group):
+    # same as show() does with the result of to_assembly
+    if len(part_group.objects) == 1 and isinstance(
+        part_group.objects[0], ocp_tessellate.PartGroup
+    ):
+        return part_group.objects[0]
+    return part_group
+
+
+def run_stages(objs):
+    """Time all stages once, return {stage: seconds}, the payload size and the
+    number of meshes"""
+    times = {}
+    tessellator_cache.clear()
+
+    times["to_assembly"], part_group = _timed(lambda: _unwrap(to_assembly(*objs)))
+
+    times["tessellate_group"], (instances, shapes, states) = _timed(
+        lambda: tessellate_group(part_group, PARAMS)
+    )
+
+    shapes = copy_tree(shapes)
+    times["combined_bb"], bb = _timed(lambda: combined_bb(shapes))
+    shapes["bb"] = bb.to_dict()
+
+    data = {
+        "data": dict(instances=instances, shapes=shapes, states=states),
+        "type": "data",
+        "config": {},
+        "count": part_group.count_shapes(),
+    }
+    times["numpy_to_buffer_json"], data["data"] = _timed(
+        lambda: numpy_to_buffer_json(data["data"])
+    )
+    times["orjson.dumps"], message = _timed(lambda: orjson.dumps(data))
+
+    tessellator_cache.clear()
+    clear_cache()
+    times["show"], _ = _timed(lambda: show(*objs, progress=None, **PARAMS))
+
+    return times, len(message), sum(1 for i in instances if i is not None)
+
+
+def benchmark(name, objs, repeat, parts=None):
+    runs = [run_stages(objs) for _ in range(repeat)]
+    _, size, meshes = runs[-1]
+
+    results = []
+    for stage in runs[0][0]:
+        times = [run[0][stage] for run in runs]
+        results.append(
+            {
+                "model": name,
+                "parts": len(objs) if parts is None else parts,
+                "meshes": meshes,
+                "stage": stage,
+                "times": times,
+                "min": min(times),
+                "median": statistics.median(times),
+                "bytes": size,
+            }
+        )
+        print(
+            f"{name:22s} {results[-1]['parts']:6d} {stage:22s} "
+            f"min {results[-1]['min']:9.4f}s  median {results[-1]['median']:9.4f}s"
+        )
+    return results
+
+
+def model_objects(name, size=None):
+    """Objects of an example or of a synthetic model with size parts"""
+    if name in EXAMPLE_FILES:
+        return example_objects(EXAMPLE_FILES[name])
+    return SYNTHETIC[name](size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=list(SYNTHETIC) + list(EXAMPLE_FILES),
+        choices=list(SYNTHETIC) + list(EXAMPLE_FILES),
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    results = []
+    skipped = []
+    for name in args.models:
+        for size in [None] if name in EXAMPLE_FILES else args.sizes:
+            try:
+                objs = model_objects(name, size)
+            except Exception as ex:  # pylint: disable=broad-except
+                # only the CAD library runs here, not the benchmarked code
+                print(f"Skipping {name}, the model cannot be created: {ex!r}")
+                skipped.append(name)
+                break
+            results.extend(benchmark(name, objs, args.repeat, size))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "ocp_vscode": _version("ocp_vscode"),
+            "ocp_tessellate": _version("ocp_tessellate"),
+            "repeat": args.repeat,
+            "params": PARAMS,
+            "skipped": skipped,
+        },
+        "results": results,
+    }
+    with open(args.out, "wb") as fd:
+        fd.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Compare two benchmark results of bench_show.py
+
+    python benchmarks/compare.py base.json new.json --threshold 1.2
+
+Prints the ratio new / base of the minimum time per model, size and stage and
+exits with 1 if any ratio exceeds the threshold.
+"""
+
+import argparse
+import sys
+
+import orjson
+
+
+def _load(filename):
+    with open(filename, "rb") as fd:
+        report = orjson.loads(fd.read())
+    return report["meta"], {
+        (r["model"], r["parts"], r["stage"]): r for r in report["results"]
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    base_meta, base = _load(args.base)
+    new_meta, new = _load(args.new)
+    print(f"base: {base_meta.get('commit')}  new: {new_meta.get('commit')}\n")
+
+    regressions = 0
+    for key in sorted(base.keys() & new.keys(), key=str):
+        ratio = new[key]["min"] / max(base[key]["min"], 1e-9)
+        flag = ""
+        if ratio > args.threshold:
+            flag = "  <-- slower"
+            regressions += 1
+        print(
+            f"{key[0]:22s} {key[1]:6d} {key[2]:22s} "
+            f"{base[key]['min']:9.4f}s -> {new[key]['min']:9.4f}s  {ratio:5.2f}x{flag}"
+        )
+
+    print(f"\n{regressions} regressions above {args.threshold:.2f}x")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
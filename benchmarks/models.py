@@ -0,0 +1,126 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Models for the benchmarks
+
+Synthetic models are grids of count parts:
+
+    distinct:   every part is a different shape (a box with a hole, the sizes vary)
+    instanced:  copies of one part at different locations (one tessellation)
+
+for build123d and CadQuery. The examples capture the objects that the scripts in
+examples/ pass to show() and show_object().
+"""
+
+import math
+import os
+import runpy
+from unittest import mock
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, "examples")
+
+
+def _grid(i, count, spacing=3.0):
+    side = math.ceil(math.sqrt(count))
+    return ((i % side) * spacing, (i // side) * spacing, 0)
+
+
+def _size(i):
+    return 1.0 + (i % 11) * 0.05
+
+
+def build123d_distinct(count):
+    from build123d import Box, Cylinder, Pos  # pylint: disable=import-outside-toplevel
+
+    return [
+        Pos(*_grid(i, count)) * (Box(_size(i), _size(i), 1) - Cylinder(_size(i) / 4, 1))
+        for i in range(count)
+    ]
+
+
+def build123d_instanced(count):
+    from build123d import Box, Cylinder, Pos  # pylint: disable=import-outside-toplevel
+
+    part = Box(1, 1, 1) - Cylinder(0.25, 1)
+    return [Pos(*_grid(i, count)) * part for i in range(count)]
+
+
+def cadquery_distinct(count):
+    import cadquery as cq  # pylint: disable=import-outside-toplevel
+
+    return [
+        cq.Workplane()
+        .box(_size(i), _size(i), 1)
+        .faces(">Z")
+        .hole(_size(i) / 2)
+        .translate(_grid(i, count))
+        for i in range(count)
+    ]
+
+
+def cadquery_instanced(count):
+    import cadquery as cq  # pylint: disable=import-outside-toplevel
+
+    part = cq.Workplane().box(1, 1, 1).faces(">Z").hole(0.5)
+    return [part.translate(_grid(i, count)) for i in range(count)]
+
+
+SYNTHETIC = {
+    "build123d_distinct": build123d_distinct,
+    "build123d_instanced": build123d_instanced,
+    "cadquery_distinct": cadquery_distinct,
+    "cadquery_instanced": cadquery_instanced,
+}
+
+
+def example_objects(filename):
+    """Run an example script and return the objects of its last show() call.
+    show_object() calls are collected like ocp_vscode does it"""
+    calls = []
+    objects = []
+
+    # pylint: disable=unused-argument
+    def show(*cad_objs, **kwargs):
+        calls.append(list(cad_objs))
+
+    def show_object(obj, *args, clear=False, **kwargs):
+        if clear:
+            objects.clear()
+        objects.append(obj)
+        calls.append(list(objects))
+
+    def reset_show():
+        objects.clear()
+
+    with mock.patch("ocp_vscode.show", show), mock.patch(
+        "ocp_vscode.show_object", show_object
+    ), mock.patch("ocp_vscode.reset_show", reset_show), mock.patch(
+        "ocp_vscode.animation.Animation.animate"
+    ), mock.patch(
+        "ocp_vscode.set_defaults"
+    ):
+        runpy.run_path(os.path.join(EXAMPLES, filename), run_name="__benchmark__")
+
+    if not calls:
+        raise ValueError(f"{filename} does not call show() or show_object()")
+
+    return calls[-1]
+
+
+EXAMPLE_FILES = {
+    "example_box": "box.py",
+    "example_hexapod": "hexapod.py",
+}
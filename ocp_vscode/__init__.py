@@ -17,6 +17,14 @@
 from .show import *
 from .config import *
 from .comms import *
+from .cache import *
+from .pool import *
+from .delta import *
 
 from .colors import *
+from .profiling import *
+from .metrics import *
+from .batch import *
+from .archive import *
+from .lazy import *
 from .animation import Animation
@@ -0,0 +1,149 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Adaptive tessellation tolerances for show(..., adaptive=True)
+
+The linear deflection of ocp_tessellate is relative to the size of each part
+(bounding box size / 300 * deviation), so a tiny fastener gets as many
+triangles as a large housing, although it covers only a few pixels.
+
+In adaptive mode the tolerances of a part grow with the ratio of the diagonal D
+of the assembly to the diagonal d of the part:
+
+    factor = min((D / d) ** ADAPTIVE_EXPONENT, MAX_FACTOR)
+    deviation_i = deviation * factor * scale
+    angular_tolerance_i = angular_tolerance * factor * scale, at most
+                          MAX_ANGULAR_TOLERANCE (if angular_tolerance is smaller)
+
+With exponent 1 all parts get about the same absolute deflection. scale starts
+at 1. If the distinct meshes have more triangles than triangle_budget, scale is
+multiplied by the overshoot and the parts are meshed again.
+"""
+
+import math
+
+import ocp_tessellate.cad_objects as co
+from ocp_tessellate.defaults import preset
+from ocp_tessellate.ocp_utils import BoundingBox, get_location
+from ocp_tessellate.tessellator import compute_quality
+
+from .cache import bounding_box_uncached, cached_mesh, collect_parts
+from .profiling import Timer
+
+ADAPTIVE_EXPONENT = 1.0
+MAX_FACTOR = 10.0
+MAX_ANGULAR_TOLERANCE = 0.5
+
+# meshing rounds to get below the triangle budget
+ADAPTIVE_ROUNDS = 4
+
+
+def _diagonal(bb):
+    return math.sqrt(bb.xsize**2 + bb.ysize**2 + bb.zsize**2)
+
+
+def adaptive_factors(bbs):
+    """Tolerance factor per key of bbs (rough bounding boxes of the parts)"""
+    if not bbs:
+        return {}
+
+    # like combined_bb, but before tessellation
+    combined = None
+    for bb in bbs.values():
+        if combined is None:
+            combined = BoundingBox(bb)
+        else:
+            combined.update(bb)
+    size = _diagonal(combined)
+
+    return {
+        key: min((size / max(_diagonal(bb), 1e-6)) ** ADAPTIVE_EXPONENT, MAX_FACTOR)
+        for key, bb in bbs.items()
+    }
+
+
+def mesh_adaptive(part_group, params, progress=None, timeit=False):
+    """Mesh all instances of part_group with adaptive tolerances and store the
+    meshes in the instances, so that tessellate_group only collects them.
+    Parts need to be instances, see ocp_vscode.pool.with_instances.
+
+    Returns the number of triangles of the distinct meshes"""
+    deviation = preset("deviation", params.get("deviation"))
+    angular_tolerance = preset("angular_tolerance", params.get("angular_tolerance"))
+    render_edges = preset("render_edges", params.get("render_edges"))
+    budget = params.get("triangle_budget")
+    if budget is None:
+        budget = params.get("max_triangles")
+
+    parts = {}
+    collect_parts(part_group, None, parts)
+    parts = {
+        key[1]: (shapes, loc)
+        for key, (shapes, loc) in parts.items()
+        if key[0] == "ref" and co.INSTANCES[key[1]].mesh is None
+    }
+
+    with Timer(timeit, "", "adaptive bounding boxes", 2):
+        # same rough bounding boxes as OCP_Part.collect_shapes uses for the quality
+        bbs = {
+            ind: bounding_box_uncached(shapes, loc=get_location(loc), optimal=False)
+            for ind, (shapes, loc) in parts.items()
+        }
+        factors = adaptive_factors(bbs)
+
+    scale = 1.0
+    for _ in range(ADAPTIVE_ROUNDS):
+        with Timer(timeit, "", "adaptive meshing", 2) as t:
+            meshes = {}
+            for ind, (shapes, _) in parts.items():
+                part_deviation = deviation * factors[ind] * scale
+                quality = compute_quality(bbs[ind], deviation=part_deviation)
+                meshes[ind] = (
+                    cached_mesh(
+                        shapes,
+                        quality,
+                        max(
+                            angular_tolerance,
+                            min(
+                                angular_tolerance * factors[ind] * scale,
+                                MAX_ANGULAR_TOLERANCE,
+                            ),
+                        ),
+                        compute_edges=render_edges,
+                        debug=timeit,
+                        progress=progress,
+                    ),
+                    quality,
+                )
+
+            triangles = sum(len(m["triangles"]) // 3 for m, _ in meshes.values())
+            t.info = f"scale {scale:.2f}: {triangles:,} triangles"
+
+        if budget is None or triangles <= budget:
+            break
+
+        scale *= triangles / budget
+    else:
+        print(
+            f"Adaptive tessellation: {triangles:,} triangles exceed the budget "
+            f"of {budget:,}"
+        )
+
+    for ind, (mesh, quality) in meshes.items():
+        co.INSTANCES[ind].mesh = mesh
+        co.INSTANCES[ind].quality = quality
+
+    return triangles
@@ -0,0 +1,123 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Memory mapped archives of serialized scenes
+
+An archive is a file holding one framed binary message of show(...,
+format="archive"), see ocp_vscode.binary: the JSON header with tree, states,
+config and bounding box, followed by the mesh buffers aligned to 64 bytes.
+
+    save_archive("scene.ocpb", assembly, deviation=0.1)
+
+    with open_archive("scene.ocpb") as archive:
+        archive.ids()                       # ids of all parts, e.g. "/Group/box"
+        box = archive.part("/Group/box")    # read only numpy views into the file
+
+Opening an archive maps the file and parses the JSON header only. Buffers are
+not read until a part, instance or the payload is requested, and then only the
+pages of the requested buffers.
+"""
+
+import mmap
+
+from .binary import _join, _read_header
+from .show import show
+
+__all__ = ["save_archive", "open_archive", "Archive"]
+
+
+def save_archive(path, *cad_objs, **kwargs):
+    """Convert cad_objs with show(..., **kwargs) and write them as archive to path"""
+    show(*cad_objs, format="archive", out=path, **kwargs)
+
+
+def _index(node, parts):
+    if node.get("id") is not None:
+        parts[node["id"]] = node
+    for child in node.get("parts", []):
+        _index(child, parts)
+
+
+class Archive:
+    """Read only view of an archive file, see open_archive"""
+
+    def __init__(self, path):
+        with open(path, "rb") as fd:
+            self._mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.header, self._start, self._offsets = _read_header(self._mmap)
+        if self.header.get("type") != "data":
+            raise ValueError(f"{path} holds a '{self.header.get('type')}' message")
+
+        data = self.header["data"]
+        self.config = self.header["config"]
+        self.states = data["states"]
+        self.bb = data["shapes"].get("bb")
+
+        self._parts = {}
+        _index(data["shapes"], self._parts)
+
+    def _join(self, obj, copy):
+        return _join(obj, self._mmap, self._start, self._offsets, copy)
+
+    def ids(self):
+        """Ids of all groups and parts of the tree"""
+        return list(self._parts)
+
+    def instance(self, index, copy=False):
+        """Mesh index of the instances (None if unused)"""
+        mesh = self.header["data"]["instances"][index]
+        return None if mesh is None else self._join(mesh, copy)
+
+    def part(self, id, copy=False):
+        """Group or part id (see ids()) with numpy arrays. References to shared
+        meshes ({"ref": index}) are resolved. With copy=False the arrays are read
+        only views into the file"""
+        return self._resolve(self._parts[id], copy)
+
+    def _resolve(self, node, copy):
+        result = {}
+        for key, value in node.items():
+            if key == "parts":
+                result[key] = [self._resolve(child, copy) for child in value]
+            elif key == "shape" and isinstance(value, dict) and "ref" in value:
+                result[key] = self.instance(value["ref"], copy)
+            else:
+                result[key] = self._join(value, copy)
+        return result
+
+    def payload(self, copy=False):
+        """The complete payload like decode_binary returns it"""
+        return self._join(self.header, copy)
+
+    def close(self):
+        """Unmap the file. If views into the file are still referenced, the file
+        stays mapped until they are released"""
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+def open_archive(path):
+    """Map the archive at path, see Archive"""
+    return Archive(path)
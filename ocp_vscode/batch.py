@@ -0,0 +1,146 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Serialize many independent scenes with show_batch()
+
+    for result in show_batch(scenes, workers=4, deviation=0.5):
+        if result.error is None:
+            store(result.index, result.data)
+
+A scene is a cad object (or a list of them, like for show(objs)) or a dict with
+the cad objects under "cad_objs" and other show() keywords:
+
+    {"cad_objs": [box, cylinder], "names": ["box", "cylinder"], "lod": [1.0, 0.1]}
+
+Every scene gets its own Serializer, so all payloads are independent of each
+other (e.g. the camera gets reset in every payload). Shared across the batch are
+the tessellation cache (equal shapes are meshed once, meshes are keyed by
+content, see ocp_vscode.cache) and the colors of the colormap, which are taken
+once on the calling thread.
+
+On machines where the worker pool of ocp_vscode.pool gets more than one process,
+the scenes are meshed in the pool by default (parallel=True): a thread hands its
+shapes to the pool and releases the OCP lock until the meshes are back, so the
+other threads can convert and submit their scenes meanwhile. With
+parallel=False meshing runs one scene at a time under the OCP lock, and the
+threads overlap little more than encoding. Measure with
+benchmarks/bench_batch.py, with a single core the pool is slower than a loop.
+"""
+
+import contextvars
+import itertools
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from .colors import get_colormap
+from .pool import default_pool_size, start_pool
+from .show import Serializer, _align_colors
+
+__all__ = ["show_batch", "BatchResult"]
+
+# index of the scene in scenes, the payload or None, the exception or None
+BatchResult = namedtuple("BatchResult", ["index", "data", "error"])
+
+
+def _scene_args(scene, kwargs):
+    if isinstance(scene, dict):
+        scene = dict(scene)
+        cad_objs = scene.pop("cad_objs")
+        if not isinstance(cad_objs, (list, tuple)):
+            cad_objs = [cad_objs]
+        return cad_objs, dict(kwargs, **scene)
+
+    return [scene], dict(kwargs)
+
+
+def _show_scene(index, cad_objs, kwargs):
+    try:
+        return BatchResult(index, Serializer().show(*cad_objs, **kwargs), None)
+    except Exception as ex:
+        return BatchResult(index, None, ex)
+
+
+def _failed(index, ex):
+    future = Future()
+    future.set_result(BatchResult(index, None, ex))
+    return future
+
+
+def show_batch(scenes, workers=4, **kwargs):
+    """Convert scenes (any iterable) with show() in workers threads and yield a
+    BatchResult per scene in the order of completion.
+
+    kwargs are show() keywords for all scenes, a scene dict overrides them.
+    parallel defaults to True if the worker pool gets more than one process.
+    Exceptions of a scene are returned in BatchResult.error and do not stop the
+    batch. At most 2 * workers scenes are held in memory at a time.
+    """
+    if workers < 1:
+        raise ValueError("workers needs to be at least 1")
+
+    if kwargs.get("stream"):
+        raise ValueError("show_batch does not support stream=True")
+
+    kwargs.setdefault("parallel", default_pool_size() > 1)
+    if kwargs["parallel"]:
+        start_pool()
+
+    colormap = get_colormap()
+    map_colors = []
+
+    def submit(executor, index, scene):
+        try:
+            cad_objs, scene_kwargs = _scene_args(scene, kwargs)
+            if scene_kwargs.get("stream"):
+                raise ValueError("show_batch does not support stream=True")
+            scene_kwargs.setdefault("progress", None)
+
+            if colormap is not None:
+                count = len(cad_objs)
+                # every show() call starts at the beginning of the colormap
+                map_colors.extend(
+                    next(colormap) for _ in range(count - len(map_colors))
+                )
+                scene_kwargs["colors"], scene_kwargs["alphas"] = _align_colors(
+                    count,
+                    scene_kwargs.get("colors"),
+                    scene_kwargs.get("alphas"),
+                    map_colors[:count],
+                )
+        except Exception as ex:
+            return _failed(index, ex)
+
+        # the collectors of the caller, see ocp_vscode.profiling
+        context = contextvars.copy_context()
+        return executor.submit(context.run, _show_scene, index, cad_objs, scene_kwargs)
+
+    scenes = enumerate(scenes)
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="ocp_batch"
+    ) as executor:
+        pending = {
+            submit(executor, index, scene)
+            for index, scene in itertools.islice(scenes, 2 * workers)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # keep the workers busy while the results get consumed
+            pending.update(
+                submit(executor, index, scene)
+                for index, scene in itertools.islice(scenes, len(done))
+            )
+            for future in done:
+                yield future.result()
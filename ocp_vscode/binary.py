@@ -0,0 +1,177 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Framed binary message format for show() payloads
+
+Layout (all numbers little endian):
+
+    offset  size  content
+    0       4     magic b"OCPB"
+    4       2     format version (uint16)
+    6       2     alignment a of the buffer sections (uint16)
+    8       4     length n of the JSON header (uint32)
+    12      n     JSON header (utf-8)
+    ...           zero padding to the next multiple of a
+    ...           buffer sections, each starting at a multiple of a
+
+The JSON header is the payload where every numpy array is replaced by
+{"__buffer__": i, "dtype": <numpy dtype str, e.g. "<f4">, "shape": [...]}
+and the key "buffers" holds [offset, nbytes] for every buffer i. Offsets are
+relative to the start of the first buffer section. Buffers are the raw little
+endian bytes of the C contiguous arrays, so a client can create typed arrays
+(e.g. Float32Array) on top of them without copying.
+"""
+
+import struct
+
+import numpy as np
+import orjson as json
+
+__all__ = ["encode_binary", "write_binary", "decode_binary", "is_binary"]
+
+MAGIC = b"OCPB"
+VERSION = 1
+ALIGNMENT = 8
+
+# alignment of the buffers per format of show(), archives are memory mapped
+ALIGNMENTS = {"binary": ALIGNMENT, "archive": 64}
+
+PREAMBLE = struct.Struct("<4sHHI")
+
+
+def _pad(length, alignment):
+    return -length % alignment
+
+
+def _little_endian(array):
+    array = np.ascontiguousarray(array)
+    if array.dtype.byteorder == ">":
+        array = array.astype(array.dtype.newbyteorder("<"))
+    return array
+
+
+def _split(obj, buffers):
+    if isinstance(obj, np.ndarray):
+        array = _little_endian(obj)
+        buffers.append(array)
+        return {
+            "__buffer__": len(buffers) - 1,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+        }
+    elif isinstance(obj, dict):
+        return {k: _split(v, buffers) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_split(v, buffers) for v in obj]
+    else:
+        return obj
+
+
+def _layout(data, alignment):
+    # JSON header, start of the buffer sections, [offset, nbytes] and arrays
+    buffers = []
+    header = _split(data, buffers)
+
+    offsets = []
+    offset = 0
+    for array in buffers:
+        offset += _pad(offset, alignment)
+        offsets.append([offset, array.nbytes])
+        offset += array.nbytes
+    header["buffers"] = offsets
+
+    j = json.dumps(header, option=json.OPT_SERIALIZE_NUMPY)
+    start = PREAMBLE.size + len(j)
+    start += _pad(start, alignment)
+
+    return j, start, offsets, buffers
+
+
+def encode_binary(data, alignment=ALIGNMENT):
+    """Encode a payload with numpy arrays into one framed binary message"""
+    j, start, offsets, buffers = _layout(data, alignment)
+    offset = offsets[-1][0] + offsets[-1][1] if offsets else 0
+
+    message = bytearray(start + offset)
+    PREAMBLE.pack_into(message, 0, MAGIC, VERSION, alignment, len(j))
+    message[PREAMBLE.size : PREAMBLE.size + len(j)] = j
+    view = np.frombuffer(message, dtype=np.uint8)
+    for (pos, size), array in zip(offsets, buffers):
+        view[start + pos : start + pos + size] = array.ravel().view(np.uint8)
+
+    return bytes(message)
+
+
+def write_binary(data, write, alignment=ALIGNMENT):
+    """Write the message of encode_binary(data) with the function write, one
+    buffer at a time. Returns the number of bytes written"""
+    j, start, offsets, buffers = _layout(data, alignment)
+
+    write(PREAMBLE.pack(MAGIC, VERSION, alignment, len(j)))
+    write(j)
+    written = PREAMBLE.size + len(j)
+    for (pos, size), array in zip(offsets, buffers):
+        write(bytes(start + pos - written))
+        write(memoryview(array.ravel()).cast("B"))
+        written = start + pos + size
+
+    return written
+
+
+def is_binary(message):
+    return isinstance(message, (bytes, bytearray, memoryview)) and (
+        bytes(message[:4]) == MAGIC
+    )
+
+
+def _join(obj, buffer, start, offsets, copy):
+    if isinstance(obj, dict):
+        if "__buffer__" in obj:
+            pos, size = offsets[obj["__buffer__"]]
+            dtype = np.dtype(obj["dtype"])
+            array = np.frombuffer(
+                buffer, dtype=dtype, count=size // dtype.itemsize, offset=start + pos
+            ).reshape(obj["shape"])
+            return array.copy() if copy else array
+        return {k: _join(v, buffer, start, offsets, copy) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_join(v, buffer, start, offsets, copy) for v in obj]
+    else:
+        return obj
+
+
+def _read_header(message):
+    # JSON header without "buffers", start of the buffer sections, [offset, nbytes]
+    magic, version, alignment, length = PREAMBLE.unpack_from(message, 0)
+    if magic != MAGIC:
+        raise ValueError("Not an OCP binary message")
+    if version > VERSION:
+        raise ValueError(f"Unsupported OCP binary message version {version}")
+
+    header = json.loads(bytes(message[PREAMBLE.size : PREAMBLE.size + length]))
+    start = PREAMBLE.size + length
+    start += _pad(start, alignment)
+
+    offsets = header.pop("buffers")
+    return header, start, offsets
+
+
+def decode_binary(message, copy=False):
+    """Reference decoder: returns the payload with numpy arrays.
+
+    With copy=False the arrays are read only views into message."""
+    header, start, offsets = _read_header(message)
+    return _join(header, message, start, offsets, copy)
@@ -0,0 +1,139 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Triangle budget for show(..., max_triangles=N)
+
+The size of the meshes is estimated by tessellating a sample of the parts: the
+triangles of the sample are extrapolated to all parts by their number of faces.
+Starting with the configured deviation and angular_tolerance, both are
+increased until the estimate fits into the budget:
+
+    deviation = deviation * scale
+    angular_tolerance = angular_tolerance * sqrt(scale), at most
+                        MAX_ANGULAR_TOLERANCE (if angular_tolerance is smaller)
+
+with scale growing by the overshoot of the estimate in every step. Sample meshes
+are cached like all other meshes, so the final tessellation reuses them.
+"""
+
+import math
+
+from ocp_tessellate.defaults import preset
+from ocp_tessellate.ocp_utils import get_faces, get_location
+from ocp_tessellate.tessellator import compute_quality
+
+from .adaptive import MAX_ANGULAR_TOLERANCE
+from .cache import bounding_box_uncached, cached_mesh, collect_parts
+from .profiling import Timer
+
+SAMPLE_SIZE = 8
+SEARCH_STEPS = 8
+
+# minimum growth of the scale per step
+MIN_STEP = 1.25
+
+
+def _sample(parts, size):
+    # parts evenly spread over the face counts, so that simple and complex parts
+    # are part of the sample
+    parts = sorted(parts, key=lambda part: part[0])
+    if len(parts) <= size:
+        return parts
+    step = (len(parts) - 1) / (size - 1)
+    return [parts[round(i * step)] for i in range(size)]
+
+
+def estimate_triangles(sample, faces, deviation, angular_tolerance, render_edges):
+    """Estimate the triangles of all parts from the sample (faces, shapes, bb)
+    tessellated with deviation and angular_tolerance"""
+    sample_faces = 0
+    triangles = 0
+    for part_faces, shapes, bb in sample:
+        mesh = cached_mesh(
+            shapes,
+            compute_quality(bb, deviation=deviation),
+            angular_tolerance,
+            compute_edges=render_edges,
+        )
+        sample_faces += part_faces
+        triangles += len(mesh["triangles"]) // 3
+
+    return int(triangles * faces / max(sample_faces, 1))
+
+
+def fit_budget(part_group, params, max_triangles, timeit=False):
+    """Return deviation, angular_tolerance and the estimated number of triangles
+    that fit into max_triangles for the parts of part_group"""
+    deviation = preset("deviation", params.get("deviation"))
+    angular_tolerance = preset("angular_tolerance", params.get("angular_tolerance"))
+    render_edges = preset("render_edges", params.get("render_edges"))
+
+    with Timer(timeit, "", "budget sample", 2) as t:
+        parts = {}
+        collect_parts(part_group, None, parts)
+        parts = [
+            (sum(1 for shape in shapes for _ in get_faces(shape)), shapes, loc)
+            for shapes, loc in parts.values()
+        ]
+        faces = sum(part[0] for part in parts)
+        # same rough bounding boxes as OCP_Part.collect_shapes uses for the quality
+        sample = [
+            (
+                part_faces,
+                shapes,
+                bounding_box_uncached(shapes, loc=get_location(loc), optimal=False),
+            )
+            for part_faces, shapes, loc in _sample(parts, SAMPLE_SIZE)
+        ]
+        t.info = f"{len(sample)} of {len(parts)} parts, {faces:,} faces"
+
+    scale = 1.0
+    for _ in range(SEARCH_STEPS):
+        step_deviation = deviation * scale
+        step_angular_tolerance = max(
+            angular_tolerance,
+            min(angular_tolerance * math.sqrt(scale), MAX_ANGULAR_TOLERANCE),
+        )
+        with Timer(timeit, "", "budget estimate", 2) as t:
+            estimate = estimate_triangles(
+                sample, faces, step_deviation, step_angular_tolerance, render_edges
+            )
+            t.info = (
+                f"deviation {step_deviation:.3g}, angular_tolerance "
+                f"{step_angular_tolerance:.3g}: {estimate:,} triangles"
+            )
+
+        if estimate <= max_triangles:
+            break
+
+        scale *= max(estimate / max_triangles, MIN_STEP)
+    else:
+        print(
+            f"Triangle budget: estimated {estimate:,} triangles exceed the budget "
+            f"of {max_triangles:,}"
+        )
+
+    return step_deviation, step_angular_tolerance, estimate
+
+
+def count_meshes(instances):
+    """Number of triangles and vertices of the distinct meshes"""
+    triangles = vertices = 0
+    for mesh in instances:
+        if mesh is not None:
+            triangles += len(mesh["triangles"]) // 3
+            vertices += len(mesh["vertices"]) // 3
+    return triangles, vertices
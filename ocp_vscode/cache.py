@@ -0,0 +1,526 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import hashlib
+import io
+import os
+import platform
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import orjson as json
+
+# pylint: disable=no-name-in-module,import-error
+from OCP.BRepTools import BRepTools
+from OCP.TopTools import TopTools_FormatVersion
+
+import ocp_tessellate.cad_objects as co
+from ocp_tessellate.cad_objects import OCP_Part, OCP_PartGroup
+from ocp_tessellate.defaults import preset
+from ocp_tessellate.ocp_utils import (
+    bounding_box,
+    cache as bounding_box_cache,
+    get_location,
+    make_compound,
+)
+from ocp_tessellate.tessellator import compute_quality, tessellate
+
+from .profiling import Timer
+
+__all__ = ["get_cache_info", "clear_cache", "set_cache_size", "set_cache_dir"]
+
+#
+# Content hashing
+#
+
+# The flags line of every TShape: free, modified, checked, orientable, closed,
+# infinite, convex. The first three are state that OCC changes when a shape gets
+# meshed (BRepMesh resets "checked" of the faces) or added to a compound
+_FLAGS = re.compile(rb"\n\n[01]{3}([01]{4})\n")
+
+
+def _brep_bytes(shape):
+    # Write without triangulation, otherwise the hash would change once OCC has meshed the shape.
+    # The ASCII format writes doubles with all digits and allows to drop the state flags
+    version = TopTools_FormatVersion.TopTools_FormatVersion_CURRENT
+    if platform.system() == "Darwin":
+        with tempfile.NamedTemporaryFile() as tf:
+            BRepTools.Write_s(shape, tf.name, False, False, version)
+            with open(tf.name, "rb") as fd:
+                data = fd.read()
+    else:
+        bio = io.BytesIO()
+        BRepTools.Write_s(shape, bio, False, False, version)
+        data = bio.getvalue()
+
+    geometry, tshapes = data.split(b"\nTShapes ", 1)
+    return geometry + b"\nTShapes " + _FLAGS.sub(rb"\n\n\1\n", tshapes)
+
+
+def shape_digest(shape):
+    """sha256 of the serialized BRep of shape: exact, and unchanged when OCC
+    meshes the shape"""
+    return hashlib.sha256(_brep_bytes(shape)).digest()
+
+
+def mesh_key(digest, quality, angular_tolerance, compute_edges):
+    """Stable key of the mesh of the shape with digest (see shape_digest) for
+    the parameters of the mesher"""
+    h = hashlib.sha256()
+    for value in (quality, angular_tolerance, compute_edges):
+        h.update(repr(value).encode())
+        h.update(b"\0")
+    h.update(digest)
+    return h.hexdigest()
+
+
+#
+# Helpers for tessellation results
+#
+
+
+def copy_tree(obj):
+    """Copy nested dicts, lists and tuples, but share the (read only) numpy
+    buffers. Callers may change the returned trees, so cache entries are never
+    handed out"""
+    if isinstance(obj, dict):
+        return {k: copy_tree(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [copy_tree(v) for v in obj]
+    elif isinstance(obj, tuple):
+        return tuple(copy_tree(v) for v in obj)
+    else:
+        return obj
+
+
+def leaves(shapes):
+    """Leaves (the parts without "parts") of a shapes tree, depth first"""
+    if shapes.get("parts") is None:
+        yield shapes
+    else:
+        for part in shapes["parts"]:
+            yield from leaves(part)
+
+
+def nbytes(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, dict):
+        return sum(nbytes(v) for v in obj.values())
+    elif isinstance(obj, (list, tuple)):
+        return sum(nbytes(v) for v in obj)
+    else:
+        return 0
+
+
+#
+# Disk tier
+#
+
+
+def _to_disk(obj, arrays, name="array"):
+    if isinstance(obj, np.ndarray):
+        filename = f"{len(arrays)}_{name}.npy"
+        arrays.append((filename, obj))
+        return {"__npy__": filename}
+    elif isinstance(obj, dict):
+        return {k: _to_disk(v, arrays, k) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_to_disk(v, arrays, name) for v in obj]
+    else:
+        return obj
+
+
+def _from_disk(obj, folder):
+    if isinstance(obj, dict):
+        if "__npy__" in obj:
+            return np.load(os.path.join(folder, obj["__npy__"]), mmap_mode="r")
+        return {k: _from_disk(v, folder) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_from_disk(v, folder) for v in obj]
+    else:
+        return obj
+
+
+class DiskCache:
+    """Tessellation results as .npy files, loaded as read only memory maps.
+
+    Every entry is a folder named by the cache key holding an "index.json" with the
+    mesh and one .npy file per numpy buffer (vertices, normals, triangles,
+    edges). Entries are written to a temp folder and renamed, so several
+    processes can share one cache folder.
+
+    The total size is tracked per put. The folder only gets scanned when it
+    exceeds maxsize or every PRUNE_INTERVAL puts, to account for the entries
+    of other processes.
+    """
+
+    # number of puts between two scans of the folder
+    PRUNE_INTERVAL = 256
+    # pruning removes entries down to this fraction of maxsize
+    PRUNE_TARGET = 0.9
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._puts = 0
+        os.makedirs(path, exist_ok=True)
+        self.size = sum(e[1] for e in self._entries())
+
+    def _folder(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        folder = self._folder(key)
+        index_file = os.path.join(folder, "index.json")
+        try:
+            with open(index_file, "rb") as fd:
+                index = json.loads(fd.read())
+            value = _from_disk(index, folder)
+            # the modification time of the index is used for LRU pruning
+            os.utime(index_file)
+        except FileNotFoundError:
+            return None
+        except Exception as ex:  # pylint: disable=broad-except
+            print(f"Removing corrupt disk cache entry {key}: {ex}")
+            shutil.rmtree(folder, ignore_errors=True)
+            return None
+
+        return value
+
+    def put(self, key, value):
+        folder = self._folder(key)
+        if os.path.exists(folder):
+            return
+
+        parent = os.path.dirname(folder)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+        try:
+            arrays = []
+            index = _to_disk(value, arrays)
+            for filename, array in arrays:
+                np.save(os.path.join(tmp, filename), np.ascontiguousarray(array))
+            with open(os.path.join(tmp, "index.json"), "wb") as fd:
+                fd.write(json.dumps(index, option=json.OPT_SERIALIZE_NUMPY))
+            size = sum(f.stat().st_size for f in os.scandir(tmp))
+            os.rename(tmp, folder)
+        except OSError:
+            # another process was faster or the disk is full
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        with self._lock:
+            self.size += size
+            self._puts += 1
+            prune = self.size > self.maxsize or self._puts % self.PRUNE_INTERVAL == 0
+
+        if prune:
+            self.prune()
+
+    def _entries(self):
+        entries = []
+        for prefix in os.scandir(self.path):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    mtime = os.stat(os.path.join(entry.path, "index.json")).st_mtime
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                except FileNotFoundError:
+                    continue
+                entries.append((mtime, size, entry.path))
+        return entries
+
+    def prune(self):
+        entries = sorted(self._entries())
+        size = sum(e[1] for e in entries)
+        if size > self.maxsize:
+            # leave some room, so that the next puts do not prune again
+            target = self.PRUNE_TARGET * self.maxsize
+            for _, entry_size, path in entries:
+                if size <= target:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                size -= entry_size
+
+        with self._lock:
+            self.size = size
+
+    def clear(self):
+        for prefix in os.scandir(self.path):
+            if prefix.is_dir():
+                shutil.rmtree(prefix.path, ignore_errors=True)
+
+        with self._lock:
+            self.size = 0
+
+    def info(self):
+        entries = self._entries()
+        return {
+            "path": self.path,
+            "entries": len(entries),
+            "size": sum(e[1] for e in entries),
+            "maxsize": self.maxsize,
+        }
+
+
+#
+# LRU cache
+#
+
+
+class TessellationCache:
+    def __init__(self, maxsize, disk=None):
+        self.maxsize = maxsize
+        self.disk = disk
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy_tree(entry[0])
+
+        value = None if self.disk is None else self.disk.get(key)
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.disk_hits += 1
+            self._put(key, value)
+            return copy_tree(value)
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value)
+
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def _put(self, key, value):
+        size = nbytes(value)
+        if size > self.maxsize:
+            return
+
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+
+        self._entries[key] = (copy_tree(value), size)
+        self.size += size
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.maxsize and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+        if disk and self.disk is not None:
+            self.disk.clear()
+
+    def info(self):
+        with self._lock:
+            result = {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size": self.size,
+                "maxsize": self.maxsize,
+            }
+        if self.disk is not None:
+            result["disk"] = self.disk.info()
+        return result
+
+
+def _size_from_env(name, default_mb):
+    size = os.environ.get(name)
+    return (default_mb if size is None else int(size)) * 1024 * 1024
+
+
+cache_dir = os.environ.get("OCP_VSCODE_CACHE_DIR")
+
+CACHE = TessellationCache(
+    _size_from_env("OCP_VSCODE_CACHE_SIZE_MB", 256),
+    disk=(
+        None
+        if cache_dir is None
+        else DiskCache(cache_dir, _size_from_env("OCP_VSCODE_DISK_CACHE_SIZE_MB", 2048))
+    ),
+)
+
+
+def get_cache_info():
+    """Return hits, misses, number of entries and size in bytes of the tessellation cache"""
+    return CACHE.info()
+
+
+def clear_cache(disk=False):
+    """Remove all tessellation results from the cache and reset the counters.
+    With disk=True the disk tier will be emptied, too"""
+    CACHE.clear(disk)
+
+
+def set_cache_size(size_mb):
+    """Set the maximum size of the tessellation cache in MB (0 disables caching)"""
+    CACHE.resize(int(size_mb * 1024 * 1024))
+
+
+def set_cache_dir(path, size_mb=2048):
+    """Store tessellation results additionally in the folder path, None disables the disk tier"""
+    CACHE.disk = None if path is None else DiskCache(path, int(size_mb * 1024 * 1024))
+
+
+#
+# Meshes
+#
+
+# ocp_tessellate caches meshes under id() of the shapes. Ids get reused once a
+# shape is freed, so a later shape could get the mesh of a former one. All
+# meshes of ocp_vscode are cached by content in CACHE instead
+tessellate_uncached = tessellate.__wrapped__
+
+# ocp_tessellate caches bounding boxes under HashCode() of the shapes, which
+# gets reused like id()
+bounding_box_uncached = bounding_box.__wrapped__
+
+
+def forget_bounding_boxes():
+    """Empty the bounding box cache of ocp_tessellate, which collect_shapes uses
+    for edges and vertices, so that no shape gets the bounding box of a freed
+    one. Call it before collect_shapes with the OCP lock held"""
+    bounding_box_cache.clear()
+
+
+def collect_parts(part_group, loc, result):
+    """Collect (shapes, location of the parent group) of every part of part_group
+    to be meshed, keyed by instance ref or part"""
+    # same location handling as OCP_PartGroup.collect_shapes
+    if loc is None and part_group.loc is None:
+        loc = None
+    elif loc is None:
+        loc = part_group.loc
+    else:
+        loc = loc * part_group.loc
+
+    for obj in part_group.objects:
+        if isinstance(obj, OCP_PartGroup):
+            collect_parts(obj, loc, result)
+
+        elif isinstance(obj, OCP_Part):
+            if isinstance(obj.shape, dict):
+                key = ("ref", obj.shape["ref"])
+                shapes = [co.INSTANCES[obj.shape["ref"]].shape]
+            else:
+                key = ("part", id(obj))
+                shapes = obj.shape
+
+            if key not in result:
+                result[key] = (shapes, loc)
+
+
+def part_quality(shapes, loc, deviation):
+    """Quality of the mesher for shapes in a group at loc"""
+    # same rough bounding box as OCP_Part.collect_shapes uses
+    bb = bounding_box_uncached(shapes, loc=get_location(loc), optimal=False)
+    return compute_quality(bb, deviation=deviation)
+
+
+def cached_mesh(
+    shapes, quality, angular_tolerance, compute_edges=True, debug=False, progress=None
+):
+    """Mesh of shapes (a list like for ocp_tessellate's tessellate) from CACHE,
+    tessellated and cached on a miss"""
+    shape = make_compound(shapes) if len(shapes) > 1 else shapes[0]
+    key = mesh_key(shape_digest(shape), quality, angular_tolerance, compute_edges)
+
+    mesh = CACHE.get(key)
+    if mesh is None:
+        mesh = tessellate_uncached(
+            [shape],
+            None,
+            quality,
+            angular_tolerance,
+            compute_edges=compute_edges,
+            debug=debug,
+            progress=progress,
+        )
+        CACHE.put(key, mesh)
+
+    elif progress is not None:
+        progress.update("c")
+
+    return mesh
+
+
+def mesh_instances(part_group, params, progress=None, timeit=False, loc=None):
+    """Mesh all instances of part_group without mesh (in the group at loc) and
+    store the meshes in the instances, so that tessellate_group only collects
+    them. Parts need to be instances, see ocp_vscode.pool.with_instances.
+    The caller needs to hold the OCP lock with the instances of part_group"""
+    deviation = preset("deviation", params.get("deviation"))
+    angular_tolerance = preset("angular_tolerance", params.get("angular_tolerance"))
+    render_edges = preset("render_edges", params.get("render_edges"))
+
+    parts = {}
+    collect_parts(part_group, loc, parts)
+
+    with Timer(timeit, "", "mesh instances", 2) as t:
+        for (kind, ind), (shapes, part_loc) in parts.items():
+            if kind != "ref" or co.INSTANCES[ind].mesh is not None:
+                continue
+
+            quality = part_quality(shapes, part_loc, deviation)
+            co.INSTANCES[ind].mesh = cached_mesh(
+                shapes,
+                quality,
+                angular_tolerance,
+                compute_edges=render_edges,
+                debug=timeit,
+                progress=progress,
+            )
+            co.INSTANCES[ind].quality = quality
+        t.count = len(parts)
@@ -1,11 +1,41 @@
+import asyncio
+import atexit
 import enum
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+
+from websockets.client import connect as async_connect
+from websockets.exceptions import ConnectionClosed
 from websockets.sync.client import connect
 import orjson as json
-from ocp_tessellate.utils import Timer
+from .binary import is_binary
+from .metrics import count_send_failure, observe_payload
+from .profiling import Timer
+
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except:
+    HAS_ZSTD = False
 
 CMD_URL = "ws://127.0.0.1"
 CMD_PORT = 3939
 
+# seconds a connection may be idle before it gets checked with a ping
+KEEPALIVE = 5
+PING_TIMEOUT = 2
+
+# seconds to wait for the viewer to announce its codecs, older viewers do not answer
+NEGOTIATE_TIMEOUT = 1
+
+# seconds to wait for the answer to a command, the connection is locked meanwhile
+RECV_TIMEOUT = 10
+
+COMPRESSION = {"codec": None, "level": None, "threshold": 64 * 1024}
+
 #
 # Send data to the viewer
 #
@@ -18,58 +48,405 @@ class MessageType(enum.IntEnum):
     listen = 4
 
 
-__all__ = ["send_data", "send_command", "set_port", "get_port", "listener"]
+__all__ = [
+    "send_data",
+    "send_command",
+    "set_port",
+    "get_port",
+    "listener",
+    "close_connections",
+    "async_send_data",
+    "async_send_command",
+    "set_compression",
+    "get_compression",
+]
 
 
 def get_port():
     return CMD_PORT
 
 
+def set_compression(codec="zlib", level=None, threshold=64 * 1024):
+    """Compress messages to the viewer.
+
+    codec:     "zlib", "zstd" (needs the zstandard package) or None to disable
+    level:     Compression level, None uses the default level of the codec
+    threshold: Messages smaller than threshold bytes are sent uncompressed
+
+    A codec is only used if the viewer announces that it supports it. Viewers
+    without zstd (VS Code with Node before 22.15) get zlib with its default
+    level instead."""
+    if codec not in (None, "zlib", "zstd"):
+        raise ValueError(f"Unknown codec '{codec}', use 'zlib', 'zstd' or None")
+
+    if codec == "zstd" and not HAS_ZSTD:
+        print("zstd needs the 'zstandard' package, using zlib")
+        codec = "zlib"
+
+    COMPRESSION.update(codec=codec, level=level, threshold=threshold)
+
+
+def get_compression():
+    return dict(COMPRESSION)
+
+
+def _compress(message, codec, level):
+    if codec == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        compressed = compressor.compress(message)
+    else:
+        compressed = zlib.compress(message, -1 if level is None else level)
+    return b"Z:" + codec.encode() + b":" + compressed
+
+
+def decompress_message(message):
+    """Reference decoder: the inner message of a "Z:<codec>:" message"""
+    if not message.startswith(b"Z:"):
+        return message
+
+    codec, compressed = message[2:].split(b":", 1)
+    if codec == b"zstd":
+        return zstandard.ZstdDecompressor().decompress(compressed)
+    return zlib.decompress(compressed)
+
+
+def _maybe_compress(message, get_codecs, timeit=False):
+    """Compress message if compression is enabled, the message is large enough
+    and the viewer supports the codec. get_codecs is only called when needed."""
+    codec, level = COMPRESSION["codec"], COMPRESSION["level"]
+    if codec is None or len(message) < COMPRESSION["threshold"]:
+        return message
+
+    codecs = get_codecs()
+    if codec not in codecs:
+        if "zlib" not in codecs:
+            return message
+        # levels of zstd and zlib differ
+        codec, level = "zlib", None
+
+    with Timer(timeit, "", "compress", 1) as t:
+        size = len(message)
+        message = _compress(message, codec, level)
+        t.info = (
+            f"{codec}: {size:,} -> {len(message):,} bytes ({size / len(message):.1f}x)"
+        )
+        t.bytes = len(message)
+    return message
+
+
+def _negotiate(ws):
+    """Ask the viewer for the codecs it can decompress"""
+    ws.send(b'C:"codecs"')
+    try:
+        return json.loads(ws.recv(NEGOTIATE_TIMEOUT))
+    except TimeoutError:
+        return []
+
+
 def set_port(port):
     global CMD_PORT
     CMD_PORT = port
 
 
-def _send(data, message_type, port=None, timeit=False):
-    if port is None:
-        port = CMD_PORT
-    try:
-        with Timer(timeit, "", "json dumps", 1):
-            j = json.dumps(data)
-            if message_type == MessageType.command:
-                j = b"C:" + j
-            elif message_type == MessageType.data:
-                j = b"D:" + j
+class Connection:
+    """Persistent websocket connection to the viewer listening on one port.
 
-        with Timer(timeit, "", "websocket send", 1):
-            ws = connect(f"{CMD_URL}:{port}")
-            ws.send(j)
+    The connection is opened lazily, checked with a ping when it was idle for
+    more than KEEPALIVE seconds and reopened once when sending fails. A lock
+    serializes send and receive, so threads can share one connection. Answers
+    are awaited at most RECV_TIMEOUT seconds and never lead to a second send.
+    """
 
-            result = None
-            if message_type == MessageType.command:
-                try:
-                    result = json.loads(ws.recv())
-                except Exception as ex:
-                    print(ex)
+    def __init__(self, port):
+        self.port = port
+        self.ws = None
+        self.codecs = None
+        self.last_used = 0
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        self._close()
+        self.ws = connect(f"{CMD_URL}:{self.port}")
+        # the viewer might have changed, negotiate again
+        self.codecs = None
+
+    def get_codecs(self):
+        """Codecs the viewer can decompress, negotiated once per connection"""
+        with self.lock:
+            try:
+                if not self._is_alive():
+                    self._connect()
+                if self.codecs is None:
+                    self.codecs = _negotiate(self.ws)
+            except (ConnectionClosed, OSError):
+                self._close()
+                return []
+            return self.codecs
+
+    def _close(self):
+        if self.ws is not None:
             try:
-                ws.close()
+                self.ws.close()
             except:
                 pass
+            self.ws = None
+
+    def _is_alive(self):
+        if self.ws is None:
+            return False
+        if time.monotonic() - self.last_used < KEEPALIVE:
+            return True
+        try:
+            return self.ws.ping().wait(PING_TIMEOUT)
+        except Exception:
+            return False
 
+    def send(self, message, response=False):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if not self._is_alive():
+                        self._connect()
+
+                    self.ws.send(message)
+                    break
+
+                except (ConnectionClosed, OSError):
+                    # the viewer might have been restarted, try a new connection once
+                    self._close()
+                    if attempt > 0:
+                        raise
+
+            result = None
+            if response:
+                try:
+                    result = self.ws.recv(RECV_TIMEOUT)
+                except (ConnectionClosed, OSError):
+                    # the message was sent, so it is not sent again. A late answer
+                    # would be read as the answer of the next command, reconnect
+                    self._close()
+                    raise
+
+            self.last_used = time.monotonic()
             return result
 
+    def close(self):
+        with self.lock:
+            self._close()
+
+
+CONNECTIONS = {}
+CONNECTIONS_LOCK = threading.Lock()
+
+
+def get_connection(port=None):
+    if port is None:
+        port = CMD_PORT
+    with CONNECTIONS_LOCK:
+        connection = CONNECTIONS.get(port)
+        if connection is None:
+            connection = CONNECTIONS[port] = Connection(port)
+    return connection
+
+
+def close_connections():
+    """Close all persistent connections to the viewers"""
+    with CONNECTIONS_LOCK:
+        connections = list(CONNECTIONS.values())
+        CONNECTIONS.clear()
+    for connection in connections:
+        connection.close()
+
+
+atexit.register(close_connections)
+
+
+def _send_once(message, port, response=False, timeit=False):
+    ws = connect(f"{CMD_URL}:{port}")
+    message = _maybe_compress(message, lambda: _negotiate(ws), timeit)
+    ws.send(message)
+
+    result = None
+    if response:
+        try:
+            result = ws.recv()
+        except Exception as ex:
+            print(ex)
+    try:
+        ws.close()
+    except:
+        pass
+
+    return result
+
+
+def _encode(data, message_type):
+    j = json.dumps(data)
+    if message_type == MessageType.command:
+        j = b"C:" + j
+    elif message_type == MessageType.data:
+        j = b"D:" + j
+    return j
+
+
+# message types resources/webview.html renders
+VIEWER_TYPES = ("data", "clear", "ui", "animation")
+
+STREAM_TYPES = ("stream_start", "stream_chunk", "stream_end")
+
+
+def check_viewer_message(data):
+    """Raise a ValueError for messages the viewer cannot decode. The viewer
+    renders "data" payloads with hex encoded float32 buffers only"""
+    if is_binary(data):
+        raise ValueError(
+            "The viewer cannot decode binary messages, use show(..., format='json')"
+        )
+
+    if isinstance(data, Iterator):
+        raise ValueError(
+            "The viewer cannot assemble streamed messages, use show(..., stream=False)"
+            " or send ocp_vscode.stream.assemble_stream(messages)"
+        )
+
+    if not isinstance(data, dict):
+        raise ValueError(
+            f"Cannot send {type(data).__name__} to the viewer, a show() payload is needed"
+        )
+
+    message_type = data.get("type")
+    if message_type in STREAM_TYPES:
+        raise ValueError(
+            f"The viewer cannot assemble '{message_type}' messages, use"
+            " show(..., stream=False) or send ocp_vscode.stream.assemble_stream(messages)"
+        )
+    if message_type == "delta":
+        raise ValueError(
+            "The viewer cannot apply 'delta' messages, use show(..., delta=False)"
+        )
+    if message_type == "lazy_part" or data.get("lazy"):
+        raise ValueError(
+            "The viewer cannot load parts lazily, use show(..., lazy=False)"
+        )
+    if message_type not in VIEWER_TYPES:
+        raise ValueError(f"The viewer cannot handle '{message_type}' messages")
+
+    if message_type == "data" and (data.get("config") or {}).get("quantize"):
+        raise ValueError(
+            "The viewer cannot decode quantized buffers, use show(..., quantize=False)"
+        )
+
+
+def _decode(result):
+    if result is not None:
+        try:
+            result = json.loads(result)
+        except Exception as ex:
+            print(ex)
+            result = None
+    return result
+
+
+def _send(data, message_type, port=None, timeit=False, persistent=True):
+    if port is None:
+        port = CMD_PORT
+    if message_type == MessageType.data:
+        check_viewer_message(data)
+    try:
+        with Timer(timeit, "", "json dumps", 1) as t:
+            j = _encode(data, message_type)
+            t.bytes = len(j)
+
+        response = message_type == MessageType.command
+        if persistent:
+            connection = get_connection(port)
+            j = _maybe_compress(j, connection.get_codecs, timeit)
+
+        with Timer(timeit, "", "websocket send", 1) as t:
+            if persistent:
+                result = connection.send(j, response)
+                t.info = f"{len(j):,} bytes"
+                t.bytes = len(j)
+            else:
+                result = _send_once(j, port, response, timeit)
+
+            observe_payload(len(j), message_type.name)
+            return _decode(result)
+
+    except Exception as ex:
+        count_send_failure()
+        print("Cannot connect to viewer, is it running and the right port provided?")
+        print(ex)
+        return
+
+
+def send_data(data, port=None, timeit=False, persistent=True):
+    """Send a show() payload to the viewer. Messages the viewer cannot decode
+    raise a ValueError, see check_viewer_message"""
+    return _send(data, MessageType.data, port, timeit, persistent)
+
+
+def send_command(data, port=None, timeit=False, persistent=True):
+    return _send(data, MessageType.command, port, timeit, persistent)
+
+
+#
+# Send data to the viewer from an asyncio event loop
+#
+
+
+async def _async_negotiate(ws):
+    await ws.send(b'C:"codecs"')
+    try:
+        return json.loads(await asyncio.wait_for(ws.recv(), NEGOTIATE_TIMEOUT))
+    except asyncio.TimeoutError:
+        return []
+
+
+async def _async_send(data, message_type, port=None, timeit=False, executor=None):
+    if port is None:
+        port = CMD_PORT
+    if message_type == MessageType.data:
+        check_viewer_message(data)
+    loop = asyncio.get_running_loop()
+    try:
+        with Timer(timeit, "", "json dumps", 1) as t:
+            # encoding megabytes of mesh data would block the event loop
+            j = await loop.run_in_executor(executor, _encode, data, message_type)
+            t.bytes = len(j)
+
+        with Timer(timeit, "", "websocket send", 1) as t:
+            async with async_connect(f"{CMD_URL}:{port}") as ws:
+                codec = COMPRESSION["codec"]
+                if codec is not None and len(j) >= COMPRESSION["threshold"]:
+                    codecs = await _async_negotiate(ws)
+                    j = await loop.run_in_executor(
+                        executor, _maybe_compress, j, lambda: codecs, timeit
+                    )
+                await ws.send(j)
+                t.info = f"{len(j):,} bytes"
+                t.bytes = len(j)
+
+                result = None
+                if message_type == MessageType.command:
+                    result = await ws.recv()
+
+            observe_payload(len(j), message_type.name)
+            return _decode(result)
+
     except Exception as ex:
+        count_send_failure()
         print("Cannot connect to viewer, is it running and the right port provided?")
         print(ex)
         return
 
 
-def send_data(data, port=None, timeit=False):
-    return _send(data, MessageType.data, port, timeit)
+async def async_send_data(data, port=None, timeit=False, executor=None):
+    return await _async_send(data, MessageType.data, port, timeit, executor)
 
 
-def send_command(data, port=None, timeit=False):
-    return _send(data, MessageType.command, port, timeit)
+async def async_send_command(data, port=None, timeit=False, executor=None):
+    return await _async_send(data, MessageType.command, port, timeit, executor)
 
 
 #
@@ -99,6 +99,10 @@ CONFIG_CONTROL_KEYS = [
     "render_normals",
     "reset_camera",
     "timeit",
+    "quantize",
+    "adaptive",
+    "triangle_budget",
+    "max_triangles",
 ]
 
 CONFIG_KEYS = CONFIG_WORKSPACE_KEYS + CONFIG_CONTROL_KEYS + ["zoom"]
@@ -136,6 +140,8 @@ DEFAULTS = {
     "render_mates": False,
     "render_joints": False,
     "helper_scale": 1.0,
+    "quantize": False,
+    "adaptive": False,
     "timeit": False,
     "reset_camera": Camera.RESET,
     "debug": False,
@@ -221,6 +227,10 @@ def set_defaults(
     render_mates=None,
     render_joints=None,
     helper_scale=None,
+    quantize=None,
+    adaptive=None,
+    triangle_budget=None,
+    max_triangles=None,
     mate_scale=None,  # DEPRECATED
     debug=None,
     timeit=None,
@@ -279,6 +289,14 @@ def set_defaults(
         render_mates:      Render mates for MAssemblies (default=False)
         render_joints:     Render mates for MAssemblies (default=False)
         helper_scale:      Scale of rendered helpers (locations, axis, mates for MAssemblies) (default=1)
+        quantize:          Send positions as uint16 relative to the bounding box of each mesh and normals
+                           octahedral encoded as 2 x int8, see ocp_vscode.quantize (default=False)
+        adaptive:          Coarser tolerances for parts that are small relative to the assembly,
+                           see ocp_vscode.adaptive (default=False)
+        triangle_budget:   Adaptive mode: maximum number of triangles of all distinct meshes
+                           (default=None)
+        max_triangles:     Increase deviation and angular_tolerance until the estimated number of
+                           triangles fits, see ocp_vscode.budget (default=None)
 
     - Debug
         debug:             Show debug statements to the VS Code browser console (default=False)
@@ -329,7 +347,7 @@ global_config['collapse'] = Collapse.NONE
 global_config['explode'] = True
 
 def workspace_config(port=None):
-    return global_config
+    return dict(global_config)
     if port is None:
         port = get_port()
     try:
@@ -354,7 +372,7 @@ def workspace_config(port=None):
 
 
 def combined_config(port=None, use_status=True):
-    return global_config
+    return {**global_config, **DEFAULTS}
     if port is None:
         port = get_port()
 
@@ -413,6 +431,8 @@ def reset_defaults():
         "render_mates": False,
         "render_joints": False,
         "helper_scale": 1.0,
+        "quantize": False,
+        "adaptive": False,
         "timeit": False,
         "reset_camera": Camera.RESET,
         "debug": False,
@@ -0,0 +1,138 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Payload level deduplication of meshes
+
+to_assembly only detects instances that share the same TShape. Shapes that
+are geometrically equal, but distinct TopoDS_Shapes (e.g. copied or translated
+fasteners), are tessellated into equal meshes that would be sent several times.
+
+dedup_meshes compares all meshes (instances and inline meshes of the leaves)
+after translating them to their minimum corner, keeps one mesh per group of
+equal meshes and lets the leaves reference it with a correspondingly
+translated location.
+"""
+
+import hashlib
+
+import numpy as np
+
+# mesh buffers that hold positions and move with a translation
+POSITIONS = ("vertices", "edges")
+
+# grid of the comparison, relative to the size of the scene for positions
+POSITION_EPS = 1e-6
+NORMAL_EPS = 1e-4
+
+
+def _rotate(v, q):
+    # rotate vector v by the unit quaternion q = (x, y, z, w)
+    u = np.asarray(q[:3], dtype=np.float64)
+    uv = np.cross(u, v)
+    return v + 2.0 * (q[3] * uv + np.cross(u, uv))
+
+
+def _offset(mesh):
+    vertices = np.asarray(mesh["vertices"]).reshape(-1, 3)
+    if vertices.size == 0:
+        return np.zeros(3)
+    return vertices.min(axis=0).astype(np.float64)
+
+
+def _mesh_key(mesh, offset, eps):
+    h = hashlib.sha256()
+    for key in sorted(mesh):
+        value = mesh[key]
+        h.update(key.encode())
+        if not isinstance(value, np.ndarray):
+            h.update(repr(value).encode())
+            continue
+
+        h.update(f"{value.dtype.str}{value.shape}".encode())
+        if key in POSITIONS:
+            value = np.rint((value.reshape(-1, 3) - offset) / eps).astype(np.int64)
+        elif key == "normals":
+            value = np.rint(value / NORMAL_EPS).astype(np.int64)
+        h.update(np.ascontiguousarray(value).data)
+    return h.digest()
+
+
+def _is_mesh(shape):
+    return isinstance(shape, dict) and "vertices" in shape
+
+
+def _translate_loc(loc, d):
+    # vertices of the leaf = vertices of the kept mesh + d (in local coordinates)
+    if not d.any():
+        return loc
+
+    if loc is None or loc[0] is None:
+        return (d.tolist(), [0.0, 0.0, 0.0, 1.0])
+
+    t, q = loc
+    return ((np.asarray(t, dtype=np.float64) + _rotate(d, q)).tolist(), list(q))
+
+
+def dedup_meshes(instances, shapes, bb):
+    """Return new instances and shapes with every distinct mesh stored once.
+
+    The leaves of shapes are replaced, the meshes themselves are never changed,
+    so that cached tessellation results can be shared safely. bb is the bounding
+    box of the scene and defines the comparison accuracy of the positions."""
+    size = max(
+        bb["xmax"] - bb["xmin"], bb["ymax"] - bb["ymin"], bb["zmax"] - bb["zmin"], 1e-3
+    )
+    eps = size * POSITION_EPS
+
+    kept = []  # (mesh, offset) of the new instances
+    index = {}  # mesh key -> index in kept
+    mapping = {}  # id(mesh) -> (index in kept, offset)
+
+    def add(mesh):
+        if id(mesh) not in mapping:
+            offset = _offset(mesh)
+            key = _mesh_key(mesh, offset, eps)
+            if key not in index:
+                index[key] = len(kept)
+                kept.append((mesh, offset))
+            mapping[id(mesh)] = (index[key], offset)
+        return mapping[id(mesh)]
+
+    def walk(shapes):
+        if shapes.get("parts") is not None:
+            return {
+                k: [walk(part) for part in v] if k == "parts" else v
+                for k, v in shapes.items()
+            }
+
+        shape = shapes.get("shape")
+        if shapes.get("type") != "shapes":
+            return shapes
+        elif _is_mesh(shape):
+            mesh = shape
+        elif isinstance(shape, dict) and "ref" in shape:
+            mesh = instances[shape["ref"]]
+        else:
+            return shapes
+
+        ind, offset = add(mesh)
+        leaf = dict(shapes)
+        leaf["shape"] = {"ref": ind}
+        leaf["loc"] = _translate_loc(shapes.get("loc"), offset - kept[ind][1])
+        return leaf
+
+    shapes = walk(shapes)
+    return [mesh for mesh, _ in kept], shapes
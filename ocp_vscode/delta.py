@@ -0,0 +1,224 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Delta payloads between consecutive show(..., delta=True) calls
+
+The first call returns the full payload with an additional "seq" number.
+Every further call returns a message
+
+    {
+        "type": "delta",
+        "seq": n,
+        "base": n - 1,               # seq of the payload the delta applies to
+        "config": {...},
+        "count": ...,
+        "data": {
+            "instances": {"length": ..., "changed": {"<index>": mesh, ...}},
+            "parts": {"added": {id: leaf}, "changed": {id: leaf}, "removed": [id, ...]},
+            "tree": None or the shapes tree with leaves replaced by {"id": id},
+            "states": {"changed": {id: state}, "removed": [id, ...]},
+            "bb": bounding box of the scene,
+        },
+    }
+
+Leaves are the parts of the shapes tree without "parts", identified by their
+unique id. Only added and changed leaves and instances carry buffers.
+"""
+
+import hashlib
+
+import numpy as np
+
+__all__ = ["apply_delta", "reset_delta"]
+
+
+def _update(h, obj):
+    if isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        h.update(f"{array.dtype.str}{array.shape}".encode())
+        h.update(array.data)
+    elif isinstance(obj, dict):
+        h.update(b"{")
+        for k in sorted(obj):
+            h.update(str(k).encode())
+            _update(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"[{len(obj)}".encode())
+        for v in obj:
+            _update(h, v)
+    else:
+        h.update(repr(obj).encode())
+    h.update(b"\0")
+
+
+def content_hash(obj):
+    h = hashlib.sha256()
+    _update(h, obj)
+    return h.digest()
+
+
+def _split_tree(shapes, leaves):
+    """Shapes tree with every leaf replaced by {"id": id}, leaves are collected by id"""
+    if shapes.get("parts") is None:
+        leaves[shapes["id"]] = shapes
+        return {"id": shapes["id"]}
+
+    return {
+        k: [_split_tree(part, leaves) for part in v] if k == "parts" else v
+        for k, v in shapes.items()
+        if k != "bb"
+    }
+
+
+def _join_tree(tree, leaves):
+    if tree.get("parts") is None:
+        return leaves[tree["id"]]
+
+    return {
+        k: [_join_tree(part, leaves) for part in v] if k == "parts" else v
+        for k, v in tree.items()
+    }
+
+
+class DeltaEncoder:
+    """Keeps the content hashes of the last payload and turns the next payload
+    into a delta message"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seq = 0
+        self.instances = None
+        self.leaves = None
+        self.tree = None
+        self.states = None
+
+    def encode(self, data):
+        """data is the payload of show() before the buffers get encoded"""
+        payload = data["data"]
+        leaves = {}
+        tree = _split_tree(payload["shapes"], leaves)
+
+        instance_hashes = [content_hash(instance) for instance in payload["instances"]]
+        leaf_hashes = {k: content_hash(v) for k, v in leaves.items()}
+        tree_hash = content_hash(tree)
+        states = payload["states"]
+
+        self.seq += 1
+
+        if self.instances is None:
+            result = dict(data, seq=self.seq)
+        else:
+            changed_instances = {
+                str(i): payload["instances"][i]
+                for i, h in enumerate(instance_hashes)
+                if i >= len(self.instances) or self.instances[i] != h
+            }
+            result = {
+                "type": "delta",
+                "seq": self.seq,
+                "base": self.seq - 1,
+                "config": data["config"],
+                "count": data["count"],
+                "data": {
+                    "instances": {
+                        "length": len(instance_hashes),
+                        "changed": changed_instances,
+                    },
+                    "parts": {
+                        "added": {
+                            k: leaves[k] for k in leaf_hashes if k not in self.leaves
+                        },
+                        "changed": {
+                            k: leaves[k]
+                            for k, h in leaf_hashes.items()
+                            if k in self.leaves and self.leaves[k] != h
+                        },
+                        "removed": [k for k in self.leaves if k not in leaf_hashes],
+                    },
+                    "tree": None if tree_hash == self.tree else tree,
+                    "states": {
+                        "changed": {
+                            k: v for k, v in states.items() if self.states.get(k) != v
+                        },
+                        "removed": [k for k in self.states if k not in states],
+                    },
+                    "bb": payload["shapes"].get("bb"),
+                },
+            }
+
+        self.instances = instance_hashes
+        self.leaves = leaf_hashes
+        self.tree = tree_hash
+        self.states = {k: list(v) for k, v in states.items()}
+
+        return result
+
+
+DELTA = DeltaEncoder()
+
+
+def reset_delta():
+    """Forget the last payload, the next show(..., delta=True) returns a full payload"""
+    DELTA.reset()
+
+
+def apply_delta(previous, message):
+    """Reference client: apply a delta message to the previous full payload and
+    return the new full payload. Full payloads are returned unchanged"""
+    if message["type"] != "delta":
+        return message
+
+    if previous is None or previous.get("seq") != message["base"]:
+        raise ValueError(
+            f"Delta {message['seq']} needs base {message['base']}, "
+            f"got {None if previous is None else previous.get('seq')}"
+        )
+
+    delta = message["data"]
+    data = previous["data"]
+
+    length = delta["instances"]["length"]
+    instances = list(data["instances"][:length])
+    instances.extend([None] * (length - len(instances)))
+    for i, instance in delta["instances"]["changed"].items():
+        instances[int(i)] = instance
+
+    leaves = {}
+    tree = _split_tree(data["shapes"], leaves)
+    if delta["tree"] is not None:
+        tree = delta["tree"]
+    for k in delta["parts"]["removed"]:
+        del leaves[k]
+    leaves.update(delta["parts"]["added"])
+    leaves.update(delta["parts"]["changed"])
+
+    shapes = _join_tree(tree, leaves)
+    shapes["bb"] = delta["bb"]
+
+    states = {
+        k: v for k, v in data["states"].items() if k not in delta["states"]["removed"]
+    }
+    states.update(delta["states"]["changed"])
+
+    return {
+        "data": {"instances": instances, "shapes": shapes, "states": states},
+        "type": "data",
+        "config": message["config"],
+        "count": message["count"],
+        "seq": message["seq"],
+    }
@@ -0,0 +1,244 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Lazy per part loading for show(..., lazy=True)
+
+show(..., lazy=True) converts the objects with to_assembly only and returns a
+LazyScene. Its payload holds the shapes tree and the states like a show()
+payload, but every leaf comes without mesh ("shape": None) and with a rough
+bounding box in world coordinates:
+
+    scene = show(assembly, lazy=True)
+    scene.data                     # {"type": "data", "lazy": True, "data": {...}}
+    message = scene.part("/Group/box")
+
+Geometry is tessellated and encoded when a part or group is requested, e.g.
+when it gets visible or expanded in the viewer:
+
+    {"type": "lazy_part", "id": id,
+     "data": {"instances": {"3": mesh, ...}, "shapes": node}}
+
+node is the sub tree of id as in the show() payload, the meshes of the shared
+instances it references are under "instances". Instance meshes are computed
+once per scene and cached by content, see ocp_vscode.cache.
+"""
+
+import numpy as np
+
+import ocp_tessellate.cad_objects as co
+from ocp_tessellate.cad_objects import (
+    OCP_Edges,
+    OCP_Part,
+    OCP_PartGroup,
+    OCP_Vertices,
+)
+from ocp_tessellate.defaults import preset
+from ocp_tessellate.ocp_utils import BoundingBox, loc_to_tq, np_bbox
+from ocp_tessellate.tessellator import compute_quality
+from ocp_tessellate.utils import numpy_to_buffer_json
+
+from .binary import ALIGNMENTS, encode_binary
+from .cache import (
+    bounding_box_uncached,
+    forget_bounding_boxes,
+    leaves,
+    mesh_instances,
+)
+from .profiling import Timer
+from .quantize import quantize_mesh, quantize_meshes
+
+__all__ = ["LazyScene"]
+
+
+def _combine(loc, obj_loc):
+    # same location handling as OCP_PartGroup.collect_shapes
+    if loc is None:
+        return obj_loc
+    if obj_loc is None:
+        return loc
+    return loc * obj_loc
+
+
+def _corners(bb):
+    return np.array(
+        [
+            (x, y, z)
+            for x in (bb.xmin, bb.xmax)
+            for y in (bb.ymin, bb.ymax)
+            for z in (bb.zmin, bb.zmax)
+        ]
+    )
+
+
+def _leaf_type(obj):
+    if isinstance(obj, OCP_Part):
+        return "shapes"
+    if isinstance(obj, OCP_Edges):
+        return "edges"
+    if isinstance(obj, OCP_Vertices):
+        return "vertices"
+    raise TypeError(f"Unknown cad object {type(obj)}")
+
+
+class _TreeBuilder:
+    """Shapes tree of a part group without meshes, see lazy_tree"""
+
+    def __init__(self, deviation):
+        self.deviation = deviation
+        self.nodes = {}
+        # local bounding boxes of the shared instances
+        self.instance_bbs = {}
+
+    def local_bb(self, obj):
+        if isinstance(obj.shape, dict):
+            ref = obj.shape["ref"]
+            if ref not in self.instance_bbs:
+                self.instance_bbs[ref] = bounding_box_uncached(
+                    [co.INSTANCES[ref].shape], optimal=False
+                )
+            return self.instance_bbs[ref]
+
+        # same rough bounding box as OCP_Part.collect_shapes uses for the quality
+        return bounding_box_uncached(obj.shape, optimal=False)
+
+    def build(self, obj, path, loc):
+        node_id = f"{path}/{obj.name}"
+        self.nodes[node_id] = (obj, path, loc)
+
+        if isinstance(obj, OCP_PartGroup):
+            combined_loc = _combine(loc, obj.loc)
+            return {
+                "parts": [
+                    self.build(child, node_id, combined_loc) for child in obj.objects
+                ],
+                "loc": None if obj.loc is None else loc_to_tq(obj.loc),
+                "name": obj.name,
+                "id": node_id,
+            }
+
+        leaf_type = _leaf_type(obj)
+        local_bb = self.local_bb(obj)
+        world_loc = _combine(loc, obj.loc)
+        if world_loc is None:
+            bb = local_bb
+        else:
+            bb = BoundingBox(np_bbox(_corners(local_bb), *loc_to_tq(world_loc)))
+
+        leaf = {
+            "id": node_id,
+            "type": leaf_type,
+            "name": obj.name,
+            "shape": None,
+            "loc": None if obj.loc is None else loc_to_tq(obj.loc),
+            "bb": bb.to_dict(),
+        }
+        if leaf_type == "shapes":
+            leaf["accuracy"] = compute_quality(local_bb, deviation=self.deviation)
+        return leaf
+
+
+def lazy_tree(part_group, deviation):
+    """Return the shapes tree of part_group without meshes and the index of all
+    nodes {id: (cad object, path, location of the parent)}. The bounding boxes
+    of the leaves are rough (optimal=False) and in world coordinates.
+    The caller needs to hold the OCP lock with the instances of part_group"""
+    # like collect_shapes, fall back to the ocp_tessellate default
+    builder = _TreeBuilder(preset("deviation", deviation))
+    shapes = builder.build(part_group, "", None)
+
+    bb = None
+    for leaf in leaves(shapes):
+        if bb is None:
+            bb = BoundingBox(leaf["bb"])
+        else:
+            bb.update(leaf["bb"])
+    shapes["bb"] = (BoundingBox() if bb is None else bb).to_dict()
+
+    return shapes, builder.nodes
+
+
+class LazyScene:
+    """Payload without meshes plus a resolver for the meshes of single parts,
+    returned by show(..., lazy=True)"""
+
+    def __init__(self, data, nodes, instances, params, format, lock):
+        self.data = data
+        self._nodes = nodes
+        self._instances = instances
+        self._params = params
+        self._format = format
+        self._lock = lock
+
+    def _encode(self, message):
+        if self._format == "json":
+            return numpy_to_buffer_json(message)
+        return encode_binary(message, ALIGNMENTS[self._format])
+
+    def ids(self):
+        """Ids of all groups and parts of the tree"""
+        return list(self._nodes)
+
+    def part(self, id):
+        """Tessellate the part or group id (see ids()) and return the encoded
+        "lazy_part" message"""
+        obj, path, loc = self._nodes[id]
+        params = self._params
+        timeit = params.get("timeit")
+
+        with Timer(timeit, id, "lazy part", 1) as t:
+            with self._lock:
+                co.INSTANCES = self._instances
+                mesh_instances(OCP_PartGroup([obj]), params, timeit=timeit, loc=loc)
+                forget_bounding_boxes()
+                shapes = obj.collect_shapes(
+                    path,
+                    loc,
+                    deviation=preset("deviation", params.get("deviation")),
+                    angular_tolerance=preset(
+                        "angular_tolerance", params.get("angular_tolerance")
+                    ),
+                    edge_accuracy=preset("edge_accuracy", params.get("edge_accuracy")),
+                    render_edges=preset("render_edges", params.get("render_edges")),
+                    parallel=False,
+                    progress=None,
+                    timeit=timeit,
+                )
+
+            refs = set()
+            for leaf in leaves(shapes):
+                if isinstance(leaf.get("shape"), dict) and "ref" in leaf["shape"]:
+                    refs.add(leaf["shape"]["ref"])
+                # exact bounding box of the mesh, with numpy floats
+                if leaf.get("bb"):
+                    leaf["bb"] = BoundingBox(leaf["bb"]).to_dict()
+
+            refs = sorted(refs)
+            instances = {str(ref): self._instances[ref].mesh for ref in refs}
+
+            if preset("quantize", params.get("quantize")):
+                instances = {k: quantize_mesh(v) for k, v in instances.items()}
+                _, shapes = quantize_meshes([], shapes)
+
+            message = self._encode(
+                {
+                    "type": "lazy_part",
+                    "id": id,
+                    "data": {"instances": instances, "shapes": shapes},
+                }
+            )
+            t.count = len(instances)
+
+        return message
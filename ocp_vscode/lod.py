@@ -0,0 +1,252 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Level of detail tessellation for show(..., lod=[coarse, ..., fine])
+
+Every shape is meshed for all deviations in one pass, from coarse to fine. The
+compound, its bounding box and the edge/face maps are built once per shape, and
+the mesh is only cleaned before the first tier: BRepMesh keeps the
+triangulation of faces (e.g. planar ones) that already satisfies a finer
+tolerance and only refines the rest.
+
+The meshes are stored in the tessellation cache under the keys of
+ocp_vscode.cache.mesh_instances, so the finest tier shares its meshes with
+show() without lod. tessellate_group builds the shapes tree of every tier from
+the instance meshes of the tier.
+
+The payload of show() holds the finest tier as usual, the coarser tiers are in
+
+    "lod": [{"deviation": d, "instances": [mesh, ...]}, ...]   # coarse first
+
+with one mesh per entry of "instances" (None for unused entries).
+"""
+
+# pylint: disable=no-name-in-module,import-error
+from OCP.BRep import BRep_Tool
+from OCP.BRepMesh import BRepMesh_IncrementalMesh
+from OCP.BRepTools import BRepTools
+from OCP.TopAbs import TopAbs_EDGE, TopAbs_FACE
+from OCP.TopExp import TopExp
+from OCP.TopLoc import TopLoc_Location
+from OCP.TopoDS import TopoDS
+from OCP.TopTools import (
+    TopTools_IndexedDataMapOfShapeListOfShape,
+    TopTools_IndexedMapOfShape,
+)
+
+from ocp_tessellate.defaults import preset
+from ocp_tessellate.ocp_utils import get_location, make_compound
+from ocp_tessellate.tessellator import Tessellator, compute_quality
+
+from .cache import (
+    CACHE,
+    bounding_box_uncached,
+    collect_parts,
+    leaves,
+    mesh_key,
+    shape_digest,
+)
+from .profiling import Timer
+
+
+def check_lod(lod):
+    """Return the deviations of lod sorted from coarse to fine"""
+    if (
+        not isinstance(lod, (list, tuple))
+        or len(lod) == 0
+        or not all(isinstance(d, (int, float)) and d > 0 for d in lod)
+    ):
+        raise ValueError(f"lod needs to be a list of positive deviations, got {lod}")
+
+    return sorted(set(lod), reverse=True)
+
+
+class TierTessellator(Tessellator):
+    """Tessellator that meshes one shape for several tolerances, coarse to fine"""
+
+    def __init__(self, shape):
+        super().__init__()
+        self.shape = shape
+        self.parallel = self.number_solids(shape) > 1
+
+        self.edge_map = TopTools_IndexedMapOfShape()
+        self.face_map = TopTools_IndexedDataMapOfShapeListOfShape()
+        TopExp.MapShapes_s(shape, TopAbs_EDGE, self.edge_map)
+        TopExp.MapShapesAndAncestors_s(shape, TopAbs_EDGE, TopAbs_FACE, self.face_map)
+
+        # Remove previous mesh data once, the tiers refine the mesh incrementally
+        BRepTools.Clean_s(shape)
+
+    def mesh(self, quality, angular_tolerance, compute_edges=True, debug=False):
+        with Timer(debug, "", f"mesh tier {quality}", 3):
+            BRepMesh_IncrementalMesh(
+                self.shape, quality, False, angular_tolerance, self.parallel
+            )
+
+        with Timer(debug, "", "get nodes, triangles and normals", 3):
+            self.tessellate()
+
+        self.edges = []
+        if compute_edges:
+            with Timer(debug, "", "get edges", 3):
+                self.compute_edges()
+
+        return {
+            "vertices": self.get_vertices(),
+            "triangles": self.get_triangles(),
+            "normals": self.get_normals(),
+            "edges": self.get_edges(),
+        }
+
+    def compute_edges(self):
+        # Tessellator.compute_edges with the maps of __init__
+        for i in range(1, self.edge_map.Extent() + 1):
+            edge = TopoDS.Edge_s(self.edge_map.FindKey(i))
+
+            face_list = self.face_map.FindFromKey(edge)
+            if face_list.Extent() == 0:
+                continue
+
+            loc = TopLoc_Location()
+
+            face = TopoDS.Face_s(face_list.First())
+            triangle = BRep_Tool.Triangulation_s(face, loc)
+            poly = BRep_Tool.PolygonOnTriangulation_s(edge, triangle, loc)
+
+            if poly is None:
+                continue
+
+            if hasattr(poly, "Node"):  # OCCT > 7.5
+                nrange = range(1, poly.NbNodes() + 1)
+                index = poly.Node
+            else:  # OCCT == 7.5
+                indices = poly.Nodes()
+                nrange = range(indices.Lower(), indices.Upper() + 1)
+                index = indices.Value
+
+            transf = loc.Transformation()
+            v1 = None
+            for j in nrange:
+                v2 = triangle.Node(index(j)).Transformed(transf).Coord()
+                if v1 is not None:
+                    self.edges.append((v1, v2))
+                v1 = v2
+
+        if len(self.edges) == 0:
+            self._compute_missing_edges()
+
+
+def tessellate_tiers(
+    shapes,
+    deviations,
+    bb,
+    angular_tolerance,
+    compute_edges=True,
+    debug=False,
+    progress=None,
+):
+    """Meshes and qualities of shapes for all deviations (coarse to fine). Meshes
+    missing in the tessellation cache are computed with one TierTessellator and
+    cached"""
+    shape = make_compound(shapes) if len(shapes) > 1 else shapes[0]
+    digest = shape_digest(shape)
+    qualities = [compute_quality(bb, deviation=deviation) for deviation in deviations]
+
+    tess = None
+    meshes = []
+    for quality in qualities:
+        key = mesh_key(digest, quality, angular_tolerance, compute_edges)
+        mesh = CACHE.get(key)
+        if mesh is None:
+            if tess is None:
+                tess = TierTessellator(shape)
+
+            if progress is not None:
+                progress.update("+")
+
+            mesh = tess.mesh(quality, angular_tolerance, compute_edges, debug)
+            CACHE.put(key, mesh)
+
+        elif progress is not None:
+            progress.update("c")
+
+        meshes.append(mesh)
+
+    return meshes, qualities
+
+
+def prepare_tiers(part_group, params, deviations, progress=None, timeit=False):
+    """Mesh every instance of part_group for all deviations (coarse to fine).
+    Returns {instance index: (mesh, quality)} per deviation. Parts need to be
+    instances, see ocp_vscode.pool.with_instances"""
+    angular_tolerance = preset("angular_tolerance", params.get("angular_tolerance"))
+    render_edges = preset("render_edges", params.get("render_edges"))
+
+    parts = {}
+    collect_parts(part_group, None, parts)
+
+    tiers = [{} for _ in deviations]
+    for (kind, ind), (shapes, loc) in parts.items():
+        if kind != "ref":
+            continue
+
+        # same rough bounding box as OCP_Part.collect_shapes uses for the quality
+        bb = bounding_box_uncached(shapes, loc=get_location(loc), optimal=False)
+        meshes, qualities = tessellate_tiers(
+            shapes,
+            deviations,
+            bb,
+            angular_tolerance,
+            compute_edges=render_edges,
+            debug=timeit,
+            progress=progress,
+        )
+        for tier, mesh, quality in zip(tiers, meshes, qualities):
+            tier[ind] = (mesh, quality)
+
+    return tiers
+
+
+def tier_instances(shapes, count, tier):
+    """Meshes of a coarser tier for every entry of the (deduplicated) instances of
+    the finest tier.
+
+    shapes, count: shapes tree and number of instances of the finest tier
+    tier:          (instances, shapes) of the coarser tier
+
+    The first leaf that references an instance after dedup_meshes is the leaf the
+    mesh was taken from, so its mesh in the coarser tier is found by the leaf id"""
+    instances, tier_shapes = tier
+
+    meshes = {}
+    for leaf in leaves(tier_shapes):
+        shape = leaf.get("shape")
+        if leaf.get("type") != "shapes" or not isinstance(shape, dict):
+            continue
+        meshes[leaf["id"]] = instances[shape["ref"]] if "ref" in shape else shape
+
+    result = [None] * count
+    for leaf in leaves(shapes):
+        shape = leaf.get("shape")
+        if (
+            leaf.get("type") == "shapes"
+            and isinstance(shape, dict)
+            and "ref" in shape
+            and result[shape["ref"]] is None
+        ):
+            result[shape["ref"]] = meshes.get(leaf["id"])
+
+    return result
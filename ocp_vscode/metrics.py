@@ -0,0 +1,312 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""In-process metrics in the Prometheus text exposition format
+
+Nothing is recorded until enable_metrics() or start_metrics_server() is called:
+
+    from ocp_vscode import start_metrics_server
+    start_metrics_server(9464)     # curl http://127.0.0.1:9464/metrics
+
+Metrics:
+
+    ocp_vscode_show_calls_total                   show() and show_object() calls
+    ocp_vscode_parts_total                        parts serialized
+    ocp_vscode_triangles_total                    triangles of the distinct meshes serialized
+    ocp_vscode_payload_bytes{type}                size of the messages sent to the viewer
+    ocp_vscode_stage_seconds{stage}               duration of the Timer stages, see ocp_vscode.profiling
+    ocp_vscode_send_failures_total                failed websocket sends
+    ocp_vscode_cache_hits_total                   tessellation cache, read from get_cache_info()
+    ocp_vscode_cache_misses_total                 at scrape time (reset by clear_cache())
+    ocp_vscode_cache_bytes                        current size of the tessellation cache
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .cache import get_cache_info
+from .profiling import COLLECTORS, COLLECTORS_LOCK
+
+__all__ = [
+    "enable_metrics",
+    "get_metrics",
+    "start_metrics_server",
+    "stop_metrics_server",
+]
+
+METRICS = {"enabled": False, "server": None}
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(1024 * 4**i for i in range(11))  # 1 KB .. 1 GB
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(labels[k] for k in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.labels:
+            values = {(): 0}
+        return [(self.name, _labels(self.labels, k), v) for k, v in values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[k] for k in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    def samples(self):
+        with self._lock:
+            values = {
+                k: (list(counts), total) for k, (counts, total) in self._values.items()
+            }
+
+        result = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                result.append(
+                    (
+                        f"{self.name}_bucket",
+                        _labels(self.labels, key, [("le", _number(bound))]),
+                        cumulative,
+                    )
+                )
+            result.append((f"{self.name}_sum", _labels(self.labels, key), total))
+            result.append((f"{self.name}_count", _labels(self.labels, key), cumulative))
+        return result
+
+
+class _CacheMetric:
+    """Gauge or counter read from the tessellation cache at scrape time"""
+
+    def __init__(self, name, help, kind, field):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.field = field
+
+    def clear(self):
+        pass
+
+    def samples(self):
+        return [(self.name, "", get_cache_info()[self.field])]
+
+
+SHOW_CALLS = Counter("ocp_vscode_show_calls_total", "Number of show() calls")
+PARTS = Counter("ocp_vscode_parts_total", "Number of parts serialized")
+TRIANGLES = Counter(
+    "ocp_vscode_triangles_total",
+    "Number of triangles of the distinct meshes serialized",
+)
+PAYLOAD_BYTES = Histogram(
+    "ocp_vscode_payload_bytes",
+    "Size of the messages sent to the viewer",
+    BYTES_BUCKETS,
+    labels=("type",),
+)
+STAGE_SECONDS = Histogram(
+    "ocp_vscode_stage_seconds",
+    "Duration of the stages of show() and send_data()",
+    SECONDS_BUCKETS,
+    labels=("stage",),
+)
+SEND_FAILURES = Counter(
+    "ocp_vscode_send_failures_total", "Number of failed websocket sends"
+)
+
+REGISTRY = [
+    SHOW_CALLS,
+    PARTS,
+    TRIANGLES,
+    PAYLOAD_BYTES,
+    STAGE_SECONDS,
+    SEND_FAILURES,
+    _CacheMetric(
+        "ocp_vscode_cache_hits_total", "Tessellation cache hits", "counter", "hits"
+    ),
+    _CacheMetric(
+        "ocp_vscode_cache_misses_total",
+        "Tessellation cache misses",
+        "counter",
+        "misses",
+    ),
+    _CacheMetric(
+        "ocp_vscode_cache_bytes", "Size of the tessellation cache", "gauge", "size"
+    ),
+]
+
+
+class _StageCollector:
+    """Span collector of ocp_vscode.profiling feeding STAGE_SECONDS"""
+
+    def add(self, span):
+        STAGE_SECONDS.observe(span["duration"], stage=span["name"])
+
+
+STAGE_COLLECTOR = _StageCollector()
+
+
+def enable_metrics(enabled=True, reset=False):
+    """Start or stop recording metrics, with reset=True all values are set to 0"""
+    with COLLECTORS_LOCK:
+        if enabled and not METRICS["enabled"]:
+            COLLECTORS.append(STAGE_COLLECTOR)
+        elif not enabled and METRICS["enabled"]:
+            COLLECTORS.remove(STAGE_COLLECTOR)
+        METRICS["enabled"] = enabled
+
+    if reset:
+        for metric in REGISTRY:
+            metric.clear()
+
+
+def get_metrics():
+    """Return all metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def count_show():
+    if METRICS["enabled"]:
+        SHOW_CALLS.inc()
+
+
+def count_parts(parts, meshes):
+    """Count parts and the triangles of the distinct meshes (None is skipped)"""
+    if METRICS["enabled"]:
+        PARTS.inc(parts)
+        TRIANGLES.inc(
+            sum(len(mesh["triangles"]) // 3 for mesh in meshes if mesh is not None)
+        )
+
+
+def observe_payload(size, message_type):
+    if METRICS["enabled"]:
+        PAYLOAD_BYTES.observe(size, type=message_type)
+
+
+def count_send_failure():
+    if METRICS["enabled"]:
+        SEND_FAILURES.inc()
+
+
+#
+# HTTP endpoint
+#
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = get_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def start_metrics_server(port=9464, host="127.0.0.1"):
+    """Enable metrics and serve them at http://host:port/metrics from a daemon
+    thread. Returns the server, port=0 picks a free port (server.server_port)"""
+    stop_metrics_server()
+    enable_metrics()
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="ocp_vscode_metrics", daemon=True
+    )
+    thread.start()
+    METRICS["server"] = server
+    return server
+
+
+def stop_metrics_server():
+    """Stop the metrics endpoint, metrics keep being recorded"""
+    server = METRICS["server"]
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        METRICS["server"] = None
@@ -0,0 +1,256 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Long lived worker pool for show(..., parallel=True)
+
+The pool is the module global mp_tessellator.pool of ocp_tessellate. It is
+created once and kept across show() calls.
+
+show(..., parallel=True) submits the serialized shapes of all instances without
+mesh (submit_largest_first), waits for the meshes without holding the OCP lock
+(wait_results), so that other sessions can convert and tessellate meanwhile,
+and stores them in the instances and the tessellation cache (store_results).
+Meshes are looked up by content, see ocp_vscode.cache.
+"""
+
+import atexit
+import copy
+import multiprocessing
+import threading
+
+import ocp_tessellate.cad_objects as co
+import ocp_tessellate.mp_tessellator as mp
+from ocp_tessellate.cad_objects import Instance, OCP_Part, OCP_PartGroup
+from ocp_tessellate.defaults import preset
+from ocp_tessellate.ocp_utils import deserialize, get_faces, make_compound, serialize
+
+from .cache import CACHE, mesh_key, part_quality, shape_digest, tessellate_uncached
+from .profiling import Timer
+
+__all__ = ["start_pool", "resize_pool", "shutdown_pool", "get_pool_info"]
+
+POOL_LOCK = threading.RLock()
+POOL_SIZE = 0
+POOL_STARTS = 0
+
+
+def default_pool_size():
+    """Number of worker processes of a pool started without size"""
+    return max(1, int(multiprocessing.cpu_count() * 0.8))
+
+
+def _warm_up():
+    # pay the import cost of OCP and the mesher once per worker, not per task
+    # pylint: disable=import-outside-toplevel,unused-import
+    import OCP.BRepMesh
+    import OCP.BRepTools
+    import ocp_tessellate.mp_tess
+
+
+def _ready(_):
+    return True
+
+
+def start_pool(processes=None, wait=True):
+    """Start the worker pool for parallel tessellation. Does nothing if a pool with
+    the requested number of processes is running.
+
+    processes: number of worker processes (default: 80% of the cpu count)
+    wait:      block until every worker has imported OCP
+    """
+    global POOL_SIZE, POOL_STARTS  # pylint: disable=global-statement
+
+    with POOL_LOCK:
+        if processes is None:
+            processes = POOL_SIZE if mp.pool is not None else default_pool_size()
+
+        if mp.pool is not None:
+            if processes == POOL_SIZE:
+                return mp.pool
+            _close()
+
+        mp.pool = multiprocessing.Pool(processes, initializer=_warm_up)
+        POOL_SIZE = processes
+        POOL_STARTS += 1
+
+        if wait:
+            mp.pool.map(_ready, range(processes), chunksize=1)
+
+        return mp.pool
+
+
+def resize_pool(processes, wait=True):
+    """Restart the worker pool with a different number of processes"""
+    return start_pool(processes, wait)
+
+
+def _close():
+    global POOL_SIZE  # pylint: disable=global-statement
+
+    mp.pool.close()
+    mp.pool.join()
+    mp.pool = None
+    POOL_SIZE = 0
+
+
+def shutdown_pool():
+    """Stop the worker processes. The next parallel show() starts a new pool"""
+    with POOL_LOCK:
+        if mp.pool is not None:
+            _close()
+
+
+def get_pool_info():
+    """Return the number of worker processes and how often a pool was started"""
+    with POOL_LOCK:
+        return {
+            "running": mp.pool is not None,
+            "processes": POOL_SIZE,
+            "starts": POOL_STARTS,
+        }
+
+
+atexit.register(shutdown_pool)
+
+#
+# Scheduling
+#
+
+
+def with_instances(part_group):
+    """Copy of part_group where every part that is no instance reference yet
+    becomes one. Only instances can be tessellated in the pool, so this enables
+    parallel tessellation of flat lists of shapes and faces"""
+    objects = []
+    for obj in part_group.objects:
+        if isinstance(obj, OCP_PartGroup):
+            obj = with_instances(obj)
+
+        elif isinstance(obj, OCP_Part) and not isinstance(obj.shape, dict):
+            # same compound as ocp_tessellate.tessellator.tessellate would mesh
+            shapes = obj.shape if isinstance(obj.shape, (list, tuple)) else [obj.shape]
+            shape = make_compound(shapes) if len(shapes) > 1 else shapes[0]
+            co.INSTANCES.append(Instance(shape))
+            obj = copy.copy(obj)
+            obj.shape = {"ref": len(co.INSTANCES) - 1}
+
+        objects.append(obj)
+
+    group = copy.copy(part_group)
+    group.objects = objects
+    return group
+
+
+def _pending(part_group, loc, result):
+    # same location handling as OCP_PartGroup.collect_shapes
+    if loc is None and part_group.loc is None:
+        loc = None
+    elif loc is None:
+        loc = part_group.loc
+    else:
+        loc = loc * part_group.loc
+
+    for obj in part_group.objects:
+        if isinstance(obj, OCP_PartGroup):
+            _pending(obj, loc, result)
+
+        elif isinstance(obj, OCP_Part) and isinstance(obj.shape, dict):
+            ind = obj.shape["ref"]
+            if ind not in result and co.INSTANCES[ind].mesh is None:
+                result[ind] = loc
+
+
+def _mesh(data, deviation, quality, angular_tolerance, compute_edges):
+    # runs in the worker processes, which live longer than the shapes the
+    # ocp_tessellate cache keys by id()
+    return tessellate_uncached(
+        [deserialize(data)],
+        deviation,
+        quality,
+        angular_tolerance,
+        compute_edges=compute_edges,
+    )
+
+
+def submit_largest_first(part_group, params, timeit=False):
+    """Submit all instances of part_group without mesh to the pool, the ones
+    with the most faces first, so that long running tasks do not end up last.
+    Meshes in the tessellation cache are taken from there, equal shapes are
+    meshed once.
+
+    Returns the tasks for wait_results and store_results. The caller needs to
+    hold the OCP lock with the instances of part_group"""
+    deviation = preset("deviation", params.get("deviation"))
+    angular_tolerance = preset("angular_tolerance", params.get("angular_tolerance"))
+    render_edges = preset("render_edges", params.get("render_edges"))
+
+    pending = {}
+    _pending(part_group, None, pending)
+
+    order = []
+    for ind, loc in pending.items():
+        shape = co.INSTANCES[ind].shape
+        # get_faces is a generator
+        order.append((sum(1 for _ in get_faces(shape)), ind, shape, loc))
+    order.sort(key=lambda task: (-task[0], task[1]))
+
+    tasks = []
+    submitted = {}
+    with Timer(timeit, "", "submit", 2) as t:
+        for _, ind, shape, loc in order:
+            # same quality and cache key as ocp_vscode.cache.mesh_instances
+            quality = part_quality([shape], loc, deviation)
+            key = mesh_key(
+                shape_digest(shape), quality, angular_tolerance, render_edges
+            )
+            mesh = submitted.get(key)
+            if mesh is None:
+                mesh = CACHE.get(key)
+            if mesh is None:
+                mesh = mp.pool.apply_async(
+                    _mesh,
+                    (
+                        serialize(shape),
+                        deviation,
+                        quality,
+                        angular_tolerance,
+                        render_edges,
+                    ),
+                )
+                submitted[key] = mesh
+            tasks.append((ind, key, quality, mesh))
+        t.count = len(tasks)
+
+    return tasks
+
+
+def wait_results(tasks):
+    """Block until the pool has meshed all tasks, no lock is needed"""
+    for _, _, _, mesh in tasks:
+        if mp.is_apply_result(mesh):
+            mesh.wait()
+
+
+def store_results(tasks):
+    """Store the meshes of tasks in the instances and the tessellation cache,
+    so that tessellate_group only collects them. The caller needs to hold the
+    OCP lock with the instances of the tasks"""
+    for ind, key, quality, mesh in tasks:
+        if mp.is_apply_result(mesh):
+            mesh = mesh.get()
+            CACHE.put(key, mesh)
+        co.INSTANCES[ind].mesh = mesh
+        co.INSTANCES[ind].quality = quality
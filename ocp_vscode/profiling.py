@@ -0,0 +1,207 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Structured timing of show() and send_data()
+
+Every Timer of ocp_vscode ("to_assembly", "tessellate", "bb", "dedup",
+"create data obj", "json dumps", "websocket send", ...) reports a span to the
+active collectors, independent of timeit:
+
+    {
+        "id": 3,
+        "parent": 1,              # id of the enclosing span of the thread or None
+        "name": "tessellate",
+        "object": "",             # name of the object, if any
+        "start": 1700000000.123,  # seconds since the epoch
+        "duration": 0.042,        # seconds
+        "thread": 140245,
+        "info": "3 tiers",
+        "bytes": None,            # size of the result, if known
+        "count": 12,              # number of objects, if known
+    }
+
+Usage:
+
+    collector = SpanCollector()
+    show(box, collector=collector)     # or: with collect(collector): ...
+    collector.to_jsonl("spans.jsonl")
+    collector.to_chrome_trace("trace.json")   # chrome://tracing, Perfetto
+
+Any object with an add(span) method can be used as collector. A collector gets
+the spans of its own call only: collect() binds it to the current context
+(thread or asyncio task), async_show and show_batch pass the context on to their
+workers. Collectors in COLLECTORS (e.g. the stage metrics of
+ocp_vscode.metrics) get the spans of all threads.
+"""
+
+import contextvars
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import orjson as json
+from ocp_tessellate.utils import Timer as _Timer
+
+__all__ = ["SpanCollector", "collect"]
+
+# collectors for the spans of all threads
+COLLECTORS = []
+COLLECTORS_LOCK = threading.Lock()
+
+# collectors of the current context, see collect()
+_CONTEXT_COLLECTORS = contextvars.ContextVar("ocp_vscode_collectors", default=())
+
+_IDS = itertools.count(1)
+_STACK = threading.local()
+
+
+def _stack():
+    if not hasattr(_STACK, "spans"):
+        _STACK.spans = []
+    return _STACK.spans
+
+
+class SpanCollector:
+    """Collects the spans in memory"""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+    def to_jsonl(self, file):
+        """Write one JSON object per span to file (path or binary file object)"""
+        lines = b"".join(json.dumps(span) + b"\n" for span in self.spans)
+        _write(file, lines)
+
+    def to_chrome_trace(self, file):
+        """Write the spans in the Chrome trace event format to file (path or binary
+        file object)"""
+        pid = os.getpid()
+        events = [
+            {
+                "name": span["name"],
+                "cat": "ocp_vscode",
+                "ph": "X",
+                "ts": span["start"] * 1e6,
+                "dur": span["duration"] * 1e6,
+                "pid": pid,
+                "tid": span["thread"],
+                "args": {
+                    k: span[k]
+                    for k in ("id", "parent", "object", "info", "bytes", "count")
+                    if span[k] not in (None, "")
+                },
+            }
+            for span in self.spans
+        ]
+        _write(file, json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+
+
+def _write(file, data):
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "wb") as fd:
+            fd.write(data)
+    else:
+        file.write(data)
+
+
+@contextmanager
+def collect(collector):
+    """Report the spans of the current block to collector (None does nothing).
+    Spans of other threads and asyncio tasks are not reported"""
+    if collector is None:
+        yield None
+        return
+
+    token = _CONTEXT_COLLECTORS.set(_CONTEXT_COLLECTORS.get() + (collector,))
+    try:
+        yield collector
+    finally:
+        _CONTEXT_COLLECTORS.reset(token)
+
+
+def _collectors():
+    with COLLECTORS_LOCK:
+        return COLLECTORS + list(_CONTEXT_COLLECTORS.get())
+
+
+def collecting(iterator, collector):
+    """Report the spans of every step of iterator to collector"""
+    iterator = iter(iterator)
+    while True:
+        with collect(collector):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class Timer(_Timer):
+    """ocp_tessellate Timer that also reports a span to the active collectors.
+    Set bytes and count in the block to add sizes and object counts"""
+
+    def __init__(self, timeit, name, activity, level=0, newline=False):
+        super().__init__(timeit, name, activity, level, newline)
+        self.bytes = None
+        self.count = None
+        self.id = None
+        self.parent = None
+        self._start = None
+
+    def __enter__(self):
+        super().__enter__()
+        if COLLECTORS or _CONTEXT_COLLECTORS.get():
+            stack = _stack()
+            self.id = next(_IDS)
+            self.parent = stack[-1] if stack else None
+            stack.append(self.id)
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self._start is not None:
+            duration = time.perf_counter() - self._start
+            stack = _stack()
+            if stack and stack[-1] == self.id:
+                stack.pop()
+
+            span = {
+                "id": self.id,
+                "parent": self.parent,
+                "name": self.activity,
+                "object": self.name,
+                "start": self.start,
+                "duration": duration,
+                "thread": threading.get_ident(),
+                "info": self.info,
+                "bytes": self.bytes,
+                "count": self.count,
+            }
+            for collector in _collectors():
+                collector.add(span)
+
+        super().__exit__(exc_type, exc_value, exc_traceback)
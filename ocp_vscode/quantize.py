@@ -0,0 +1,150 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Quantized mesh buffers for show(..., quantize=True)
+
+A quantized mesh has the keys
+
+    "vertices":     uint16, 3 per vertex
+    "edges":        uint16, 3 per point
+    "normals":      int8, 2 per vertex (octahedral encoding)
+    "triangles":    unchanged
+    "quantization": {"min": [x, y, z], "scale": [sx, sy, sz], "normals": "oct8"}
+
+Positions are relative to the bounding box of the mesh (vertices and edges in
+mesh coordinates): p = min + q * scale with scale = (max - min) / 65535, so the
+error per axis is at most scale / 2, i.e. 1/131070 of the box size.
+
+Normals are mapped onto the octahedron |x| + |y| + |z| = 1, the lower half is
+folded over the upper one, and x, y are stored as round(127 * v). The angular
+error is below 1 degree (0.34 degrees on average).
+"""
+
+import numpy as np
+
+POSITION_MAX = 65535
+NORMAL_MAX = 127
+
+# buffers that hold positions in mesh coordinates
+POSITIONS = ("vertices", "edges")
+
+
+def _sign(v):
+    return np.where(v >= 0.0, 1.0, -1.0)
+
+
+def encode_normals(normals):
+    n = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    l1 = np.abs(n).sum(axis=1, keepdims=True)
+    l1[l1 == 0] = 1.0
+    n = n / l1
+
+    p = n[:, :2].copy()
+    lower = n[:, 2] < 0
+    p[lower] = (1.0 - np.abs(p[lower][:, ::-1])) * _sign(p[lower])
+
+    return np.rint(np.clip(p, -1.0, 1.0) * NORMAL_MAX).astype(np.int8).ravel()
+
+
+def decode_normals(encoded):
+    p = np.asarray(encoded, dtype=np.float64).reshape(-1, 2) / NORMAL_MAX
+    z = 1.0 - np.abs(p).sum(axis=1)
+    lower = z < 0
+    p[lower] = (1.0 - np.abs(p[lower][:, ::-1])) * _sign(p[lower])
+
+    n = np.column_stack([p, z])
+    n /= np.linalg.norm(n, axis=1, keepdims=True)
+    return n.astype(np.float32).ravel()
+
+
+def quantize_mesh(mesh):
+    """Return a quantized copy of mesh, the original buffers are not changed"""
+    points = [
+        np.asarray(mesh[key], dtype=np.float64).reshape(-1, 3)
+        for key in POSITIONS
+        if mesh.get(key) is not None and np.size(mesh[key]) > 0
+    ]
+    if not points:
+        return mesh
+
+    points = np.concatenate(points)
+    bb_min = points.min(axis=0)
+    scale = (points.max(axis=0) - bb_min) / POSITION_MAX
+    divisor = np.where(scale > 0, scale, 1.0)
+
+    result = dict(mesh)
+    for key in POSITIONS:
+        if mesh.get(key) is not None:
+            value = np.asarray(mesh[key], dtype=np.float64)
+            q = np.rint((value.reshape(-1, 3) - bb_min) / divisor)
+            result[key] = np.clip(q, 0, POSITION_MAX).astype(np.uint16).ravel()
+
+    if mesh.get("normals") is not None:
+        result["normals"] = encode_normals(mesh["normals"])
+
+    result["quantization"] = {
+        "min": bb_min.tolist(),
+        "scale": scale.tolist(),
+        "normals": "oct8",
+    }
+    return result
+
+
+def dequantize_mesh(mesh):
+    """Reference decoder: float32 buffers of a quantized mesh"""
+    if "quantization" not in mesh:
+        return mesh
+
+    q = mesh["quantization"]
+    result = {k: v for k, v in mesh.items() if k != "quantization"}
+    for key in POSITIONS:
+        if mesh.get(key) is not None:
+            value = np.asarray(mesh[key], dtype=np.float64).reshape(-1, 3)
+            result[key] = (
+                (np.asarray(q["min"]) + value * np.asarray(q["scale"]))
+                .astype(np.float32)
+                .ravel()
+            )
+
+    if mesh.get("normals") is not None:
+        result["normals"] = decode_normals(mesh["normals"])
+
+    return result
+
+
+def quantize_meshes(instances, shapes):
+    """Quantize all instances and the inline meshes of the leaves of shapes"""
+
+    def walk(shapes):
+        if shapes.get("parts") is not None:
+            return {
+                k: [walk(part) for part in v] if k == "parts" else v
+                for k, v in shapes.items()
+            }
+
+        shape = shapes.get("shape")
+        if (
+            shapes.get("type") == "shapes"
+            and isinstance(shape, dict)
+            and "vertices" in shape
+        ):
+            return dict(shapes, shape=quantize_mesh(shape))
+
+        return shapes
+
+    return [None if mesh is None else quantize_mesh(mesh) for mesh in instances], walk(
+        shapes
+    )
@@ -13,20 +13,31 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import asyncio
+import contextvars
+import functools
+import inspect
 import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 from ocp_tessellate import PartGroup
 from ocp_tessellate.convert import (
     tessellate_group,
+    get_accuracies,
     get_normal_len,
     combined_bb,
     to_assembly,
-    mp_get_results,
+    _to_assembly,
     is_topods_shape,
     is_vector,
 )
-from ocp_tessellate.utils import numpy_to_buffer_json, Timer, Color
+from ocp_tessellate.utils import numpy_to_buffer_json, make_unique, Color
 from ocp_tessellate.ocp_utils import (
+    BoundingBox,
+    loc_to_tq,
     is_vector,
     is_topods_shape,
     is_topods_compound,
@@ -38,8 +49,8 @@ from ocp_tessellate.ocp_utils import (
     is_toploc_location,
 )
 
-from ocp_tessellate.mp_tessellator import init_pool, keymap, close_pool
 from ocp_tessellate.cad_objects import (
+    set_instances,
     OCP_PartGroup,
     OCP_Edges,
     OCP_Faces,
@@ -48,6 +59,7 @@ from ocp_tessellate.cad_objects import (
 )
 from ocp_tessellate.convert import to_assembly, conv
 import ocp_tessellate.convert as oc
+import ocp_tessellate.cad_objects as co
 
 from .config import (
     preset,
@@ -63,27 +75,156 @@ from .config import (
 )
 from .comms import send_data, MessageType
 from .colors import *
+from .cache import forget_bounding_boxes, mesh_instances
+from .binary import ALIGNMENTS, encode_binary
+from .writer import write_payload, write_stream
+from .delta import DELTA, DeltaEncoder
+from .lazy import LazyScene, lazy_tree
+from .dedup import dedup_meshes
+from .quantize import quantize_mesh, quantize_meshes
+from .pool import (
+    start_pool,
+    store_results,
+    submit_largest_first,
+    wait_results,
+    with_instances,
+)
+from .lod import check_lod, prepare_tiers, tier_instances
+from .adaptive import mesh_adaptive
+from .budget import count_meshes, fit_budget
+from .metrics import count_parts, count_show
+from .profiling import Timer, collect, collecting
+
+__all__ = [
+    "show",
+    "show_object",
+    "reset_show",
+    "show_all",
+    "show_clear",
+    "async_show",
+    "Serializer",
+]
+
+# parameters that invalidate the already tessellated objects of show_object
+INCREMENTAL_PARAMS = (
+    "deviation",
+    "angular_tolerance",
+    "edge_accuracy",
+    "render_edges",
+    "adaptive",
+    "triangle_budget",
+    "max_triangles",
+    "render_normals",
+    "render_mates",
+    "render_joints",
+    "show_parent",
+    "helper_scale",
+    "default_color",
+    "quantize",
+)
 
-__all__ = ["show", "show_object", "reset_show", "show_all", "show_clear"]
 
-OBJECTS = {"objs": [], "names": [], "colors": [], "alphas": []}
+def _incremental_state():
+    return {
+        "key": None,
+        "objects": 0,  # number of objects of show_object already in the scene
+        "assembly_instances": [],  # (tshape, shape) tuples of to_assembly
+        "instances": [],  # encoded meshes
+        "parts": [],  # encoded shapes trees of the top level objects
+        "names": [],  # names of the top level objects before make_unique
+        "unique_names": set(),  # their names in the scene
+        "states": {},
+        "bb": None,
+        "normal_len": 0,
+        "count": 0,
+    }
 
-FIRST_CALL = True
-LAST_CALL = "other"
 
+def _objects_state():
+    return {"objs": [], "names": [], "colors": [], "alphas": []}
 
-def _tessellate(
-    *cad_objs, names=None, colors=None, alphas=None, progress=None, **kwargs
+
+# ocp_tessellate keeps the instances of to_assembly and the default colors in
+# module globals, conversion and tessellation need to hold this lock. With
+# parallel=True it is released while the worker pool meshes, see ocp_vscode.pool
+OCP_LOCK = threading.RLock()
+
+
+class Serializer:
+    """Session owning the state of show() and show_object(): the objects of
+    show_object, the scene of show_object(..., incremental=True), the last
+    payload of show(..., delta=True) and whether the camera was reset already.
+
+    Serializers are independent of each other, e.g. one per thread. Meshing
+    uses more than one core with parallel=True only, serial tessellation of
+    all serializers runs one at a time. Keywords are defaults for all calls of
+    the serializer:
+
+        serializer = Serializer(deviation=0.5, format="binary")
+        data = serializer.show(box)
+
+    The module level show(), show_object() and reset_show() use SERIALIZER.
+    """
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self.objects = _objects_state()
+        self.incremental = _incremental_state()
+        self.delta = DeltaEncoder()
+        self.first_call = True
+        self.last_call = "other"
+        # one call at a time per serializer
+        self.lock = threading.RLock()
+
+    def show(self, *cad_objs, **kwargs):
+        return show(*cad_objs, serializer=self, **dict(self.defaults, **kwargs))
+
+    def show_object(self, obj, **kwargs):
+        parameters = inspect.signature(show_object).parameters
+        defaults = {k: v for k, v in self.defaults.items() if k in parameters}
+        return show_object(obj, serializer=self, **dict(defaults, **kwargs))
+
+    def reset_show(self):
+        with self.lock:
+            self.objects = _objects_state()
+            self.incremental = _incremental_state()
+
+    def reset_delta(self):
+        """The next show(..., delta=True) of this serializer returns a full payload"""
+        self.delta.reset()
+
+
+SERIALIZER = Serializer()
+# reset_delta() resets the delta state of the module level show()
+SERIALIZER.delta = DELTA
+
+SHOW_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocp_show")
+
+
+def _prepare(
+    *cad_objs,
+    names=None,
+    colors=None,
+    alphas=None,
+    progress=None,
+    instances=None,
+    serializer=SERIALIZER,
+    **kwargs,
 ):
-    global FIRST_CALL
+    """Convert cad_objs into a part group and collect the tessellation parameters.
 
+    With instances (the list of (tshape, shape) tuples of an earlier conversion)
+    new instances get appended to this list and the root group is never
+    unwrapped, so that the top level objects can be added to an existing scene.
+    The caller needs to hold OCP_LOCK."""
+    # copy, the combined config must not be mutated by the changes below
     if workspace_config().get("_splash"):
-        conf = combined_config(use_status=False)
+        conf = dict(combined_config(use_status=False))
     else:
-        conf = combined_config(use_status=True)
-        if FIRST_CALL:
+        conf = dict(combined_config(use_status=True))
+        if serializer.first_call:
             conf["reset_camera"] = Camera.RESET.value
-            FIRST_CALL = False
+            serializer.first_call = False
         else:
             reset_camera = conf.get("reset_camera", Camera.RESET)
             conf["reset_camera"] = reset_camera.value
@@ -117,9 +258,10 @@ def _tessellate(
     if progress is None:
         progress = Progress([c for c in "-+c"])
 
-    with Timer(timeit, "", "to_assembly", 1):
+    with Timer(timeit, "", "to_assembly", 1) as t:
         changed_config = get_changed_config()
-        part_group = to_assembly(
+        convert = to_assembly if instances is None else _to_assembly
+        result = convert(
             *cad_objs,
             names=names,
             colors=colors,
@@ -134,12 +276,21 @@ def _tessellate(
             ),
             show_parent=kwargs.get("show_parent", changed_config.get("show_parent")),
             progress=progress,
+            **({} if instances is None else {"instances": instances}),
         )
 
-        if len(part_group.objects) == 1 and isinstance(
-            part_group.objects[0], PartGroup
-        ):
-            part_group = part_group.objects[0]
+        if instances is None:
+            part_group = result
+            if len(part_group.objects) == 1 and isinstance(
+                part_group.objects[0], PartGroup
+            ):
+                part_group = part_group.objects[0]
+        else:
+            part_group, converted = result
+            instances[:] = converted
+            set_instances([instance[1] for instance in instances])
+
+        t.count = part_group.count_shapes()
 
     params = {
         k: v
@@ -173,29 +324,143 @@ def _tessellate(
         elif v is not None:
             params[k] = v
 
-    parallel = preset("parallel", params.get("parallel"))
-    if parallel and not any(
-        [isinstance(obj, OCP_PartGroup) for obj in part_group.objects]
-    ):
-        print("parallel only works for assemblies, setting it to False")
-        parallel = False
-        params["parallel"] = False
+    if preset("parallel", params.get("parallel")):
+        params["parallel"] = True
+
+    # meshes are cached per instance, see ocp_vscode.cache
+    part_group = with_instances(part_group)
+
+    max_triangles = params.get("max_triangles")
+    if max_triangles is not None:
+        params["budget"] = {"max_triangles": max_triangles}
+        # adaptive mode meshes within the budget itself
+        if not preset("adaptive", params.get("adaptive")):
+            with Timer(timeit, "", "budget", 1):
+                deviation, angular_tolerance, estimate = fit_budget(
+                    part_group, params, max_triangles, timeit
+                )
+            params["deviation"] = deviation
+            params["angular_tolerance"] = angular_tolerance
+            params["budget"].update(
+                deviation=deviation,
+                angular_tolerance=angular_tolerance,
+                estimated_triangles=estimate,
+            )
 
     if kwargs.get("debug") is not None and kwargs["debug"]:
         print("\ntessellation parameters:\n", params)
 
-    with Timer(timeit, "", "tessellate", 1):
-        if parallel:
-            init_pool()
-            keymap.reset()
+    return part_group, params, timeit
+
+
+@contextmanager
+def _unlocked(lock):
+    """Release lock for the block. A lock held more than once by the caller
+    stays held"""
+    lock.release()
+    try:
+        yield
+    finally:
+        lock.acquire()
+
+
+def _tessellate_part_group(part_group, params, progress):
+    """Mesh the instances of a part group, with meshes of the tessellation cache
+    where possible, and collect instances, shapes tree and states.
+    The caller needs to hold OCP_LOCK once, for parallel tessellation it is
+    released while the pool meshes. For parallel tessellation the caller needs
+    to initialize the pool"""
+    timeit = params.get("timeit")
+
+    if preset("adaptive", params.get("adaptive")):
+        mesh_adaptive(part_group, params, progress, timeit)
+
+    elif params.get("parallel"):
+        tasks = submit_largest_first(part_group, params, timeit)
+        assembly_instances = co.INSTANCES
+        with Timer(timeit, "", "pool", 2):
+            # other sessions can convert and tessellate while the pool meshes
+            with _unlocked(OCP_LOCK):
+                wait_results(tasks)
+        co.INSTANCES = assembly_instances
+        store_results(tasks)
+
+    else:
+        mesh_instances(part_group, params, progress, timeit)
+
+    # the instances are meshed, tessellate_group only collects them
+    forget_bounding_boxes()
+    return tessellate_group(part_group, dict(params, parallel=False), progress, timeit)
 
-        instances, shapes, states = tessellate_group(
-            part_group, params, progress, params.get("timeit")
+
+def _tessellate_tiers(part_group, params, deviations, progress):
+    """Tessellate a part group for every deviation (coarse to fine). The meshes
+    of all tiers are computed in one pass per shape, see ocp_vscode.lod"""
+    tiers = prepare_tiers(
+        part_group, params, deviations, progress, params.get("timeit")
+    )
+
+    result = []
+    for deviation, meshes in zip(deviations, tiers):
+        for ind, (mesh, quality) in meshes.items():
+            co.INSTANCES[ind].mesh = mesh
+            co.INSTANCES[ind].quality = quality
+
+        forget_bounding_boxes()
+        result.append(
+            tessellate_group(
+                part_group,
+                dict(params, deviation=deviation, parallel=False),
+                progress,
+                params.get("timeit"),
+            )
         )
 
-        if parallel:
-            instances, shapes = mp_get_results(instances, shapes, progress)
-            close_pool()
+    return result
+
+
+def _tessellate(
+    *cad_objs,
+    names=None,
+    colors=None,
+    alphas=None,
+    progress=None,
+    lod=None,
+    serializer=SERIALIZER,
+    **kwargs,
+):
+    if progress is None:
+        progress = Progress([c for c in "-+c"])
+
+    with OCP_LOCK:
+        part_group, params, timeit = _prepare(
+            *cad_objs,
+            names=names,
+            colors=colors,
+            alphas=alphas,
+            progress=progress,
+            serializer=serializer,
+            **kwargs,
+        )
+
+        deviations, tiers = [], []
+        with Timer(timeit, "", "tessellate", 1) as t:
+            if lod is not None:
+                deviations = check_lod(lod)
+                params["deviation"] = deviations[-1]
+                tiers = _tessellate_tiers(part_group, params, deviations, progress)
+                instances, shapes, states = tiers.pop()
+                t.info = f"{len(deviations)} tiers"
+
+            else:
+                if params.get("parallel"):
+                    start_pool()
+
+                instances, shapes, states = _tessellate_part_group(
+                    part_group, params, progress
+                )
+
+            t.count = len(instances)
 
     params["normal_len"] = get_normal_len(
         preset("render_normals", params.get("render_normals")),
@@ -208,23 +473,100 @@ def _tessellate(
 
     # add global bounding box
     shapes["bb"] = bb
-    return instances, shapes, states, params, part_group.count_shapes()
 
+    # coarser tiers of lod as (deviation, instances, shapes), coarse first
+    tiers = [(d, tier[0], tier[1]) for d, tier in zip(deviations, tiers)]
+
+    return instances, shapes, states, params, part_group.count_shapes(), tiers
 
-def _convert(*cad_objs, names=None, colors=None, alphas=None, progress=None, **kwargs):
+
+def _convert(
+    *cad_objs,
+    names=None,
+    colors=None,
+    alphas=None,
+    progress=None,
+    format="json",
+    delta=False,
+    lod=None,
+    serializer=SERIALIZER,
+    out=None,
+    **kwargs,
+):
     timeit = preset("timeit", kwargs.get("timeit"))
 
     if progress is None:
         progress = Progress([c for c in "-+c"])
 
-    instances, shapes, states, config, count_shapes = _tessellate(
+    instances, shapes, states, config, count_shapes, tiers = _tessellate(
         *cad_objs,
         names=names,
         colors=colors,
         alphas=alphas,
         progress=progress,
+        lod=lod,
+        serializer=serializer,
         **kwargs,
     )
+    config = _viewer_config(config, kwargs)
+
+    with Timer(timeit, "", "dedup", 1) as t:
+        instances, shapes = dedup_meshes(instances, shapes, shapes["bb"])
+        t.info = f"{len(instances)} distinct meshes"
+        t.count = len(instances)
+
+    count_parts(count_shapes, instances)
+
+    if config.get("budget") is not None:
+        config["budget"]["triangles"], config["budget"]["vertices"] = count_meshes(
+            instances
+        )
+
+    if tiers:
+        with Timer(timeit, "", "lod", 1):
+            tiers = [
+                (d, tier_instances(shapes, len(instances), (tier_inst, tier_shapes)))
+                for d, tier_inst, tier_shapes in tiers
+            ]
+
+    if preset("quantize", config.get("quantize")):
+        with Timer(timeit, "", "quantize", 1):
+            instances, shapes = quantize_meshes(instances, shapes)
+            tiers = [
+                (d, [None if m is None else quantize_mesh(m) for m in meshes])
+                for d, meshes in tiers
+            ]
+
+    with Timer(timeit, "", "create data obj", 1) as t:
+        data = {
+            "data": dict(instances=instances, shapes=shapes, states=states),
+            "type": "data",
+            "config": config,
+            "count": count_shapes,
+        }
+        if tiers:
+            data["data"]["lod"] = [
+                {"deviation": d, "instances": meshes} for d, meshes in tiers
+            ]
+        if delta:
+            data = serializer.delta.encode(data)
+
+        # with out the buffers get encoded while writing
+        if out is None and format != "json":
+            data = encode_binary(data, ALIGNMENTS[format])
+            t.bytes = len(data)
+        elif out is None:
+            data["data"] = numpy_to_buffer_json(data["data"])
+
+    if out is not None:
+        with Timer(timeit, "", "write", 1) as t:
+            t.bytes = write_payload(data, out, format)
+        return None
+
+    return data
+
+
+def _viewer_config(config, kwargs):
     if config.get("dark") is not None:
         config["theme"] = "dark"
     elif config.get("orbit_control") is not None:
@@ -236,14 +578,311 @@ def _convert(*cad_objs, names=None, colors=None, alphas=None, progress=None, **k
     if kwargs.get("explode") is not None:
         config["explode"] = kwargs["explode"]
 
-    with Timer(timeit, "", "create data obj", 1):
+    return config
+
+
+def _refs(shapes):
+    """Indices of all instances referenced in a shapes tree"""
+    if shapes.get("parts") is not None:
+        for part in shapes["parts"]:
+            yield from _refs(part)
+    elif isinstance(shapes.get("shape"), dict) and "ref" in shapes["shape"]:
+        yield shapes["shape"]["ref"]
+
+
+def _update_bounds(shapes, params, bb, normal_len):
+    """Merge bounding box and normal length of a partial shapes tree into bb and
+    normal_len. Removes the bounding boxes of the leaves like combined_bb"""
+    if preset("render_normals", params.get("render_normals")) and (
+        get_accuracies(shapes)
+    ):
+        normal_len = max(
+            normal_len,
+            get_normal_len(True, shapes, preset("deviation", params.get("deviation"))),
+        )
+
+    shapes_bb = combined_bb(shapes)
+    if bb is None:
+        bb = shapes_bb
+    elif shapes_bb is not None:
+        bb.update(shapes_bb)
+
+    return bb, normal_len
+
+
+def _convert_stream(
+    *cad_objs,
+    names=None,
+    colors=None,
+    alphas=None,
+    progress=None,
+    format="json",
+    serializer=SERIALIZER,
+    **kwargs,
+):
+    """Generator version of _convert yielding one message per top level object.
+
+    Messages are "stream_start" (config, count and the root of the shapes tree),
+    one "stream_chunk" per top level object (the shapes sub tree, its states and
+    the instances it references first) and "stream_end" (bounding box and
+    normal_len). Only one chunk is held in memory at a time. See
+    ocp_vscode.stream.assemble_stream to reconstruct the show() payload.
+    """
+    if progress is None:
+        progress = Progress([c for c in "-+c"])
+
+    encode = encode_binary if format == "binary" else numpy_to_buffer_json
+
+    with OCP_LOCK:
+        part_group, params, timeit = _prepare(
+            *cad_objs,
+            names=names,
+            colors=colors,
+            alphas=alphas,
+            progress=progress,
+            serializer=serializer,
+            **kwargs,
+        )
+        # other calls might convert between two chunks
+        assembly_instances = co.INSTANCES
+    config = _viewer_config(dict(params), kwargs)
+    objects = part_group.objects
+
+    yield encode(
+        {
+            "type": "stream_start",
+            "seq": 0,
+            "config": config,
+            "count": part_group.count_shapes(),
+            "chunks": len(objects),
+            "shapes": {
+                "parts": [],
+                "loc": None if part_group.loc is None else loc_to_tq(part_group.loc),
+                "name": part_group.name,
+                "id": f"/{part_group.name}",
+            },
+        }
+    )
+
+    bb = None
+    normal_len = 0
+    sent = set()
+
+    if params.get("parallel"):
+        start_pool()
+
+    for i, obj in enumerate(objects):
+        with Timer(timeit, obj.name, "tessellate chunk", 1):
+            # tessellate the object in a group with the same name and location as
+            # part_group so that ids and locations match the full tessellation
+            group = OCP_PartGroup([obj], part_group.name, part_group.loc)
+            with OCP_LOCK:
+                co.INSTANCES = assembly_instances
+                instances, shapes, states = _tessellate_part_group(
+                    group, params, progress
+                )
+
+        refs = sorted(set(_refs(shapes)) - sent)
+        sent.update(refs)
+
+        bb, normal_len = _update_bounds(shapes, params, bb, normal_len)
+
+        chunk_instances = {str(ref): instances[ref] for ref in refs}
+        if preset("quantize", params.get("quantize")):
+            chunk_instances = {k: quantize_mesh(v) for k, v in chunk_instances.items()}
+            _, shapes = quantize_meshes([], shapes)
+
+        yield encode(
+            {
+                "type": "stream_chunk",
+                "seq": i + 1,
+                "data": {
+                    "instances": chunk_instances,
+                    "shapes": shapes["parts"][0],
+                    "states": states,
+                },
+            }
+        )
+        del instances, shapes, states
+
+    yield encode(
+        {
+            "type": "stream_end",
+            "seq": len(objects) + 1,
+            "bb": (BoundingBox() if bb is None else bb).to_dict(),
+            "normal_len": normal_len,
+        }
+    )
+
+
+def _convert_lazy(
+    *cad_objs,
+    names=None,
+    colors=None,
+    alphas=None,
+    progress=None,
+    format="json",
+    serializer=SERIALIZER,
+    **kwargs,
+):
+    """Lazy version of _convert: converts cad_objs without tessellation and
+    returns a LazyScene with the shapes tree, states and rough bounding boxes.
+    Meshes are computed per part by LazyScene.part, see ocp_vscode.lazy"""
+    with OCP_LOCK:
+        part_group, params, timeit = _prepare(
+            *cad_objs,
+            names=names,
+            colors=colors,
+            alphas=alphas,
+            progress=progress,
+            serializer=serializer,
+            **kwargs,
+        )
+        # LazyScene.part rebinds them, other calls might convert in between
+        assembly_instances = co.INSTANCES
+
+        with Timer(timeit, "", "lazy tree", 1) as t:
+            deviation = preset("deviation", params.get("deviation"))
+            shapes, nodes = lazy_tree(part_group, params.get("deviation"))
+            t.count = len(nodes)
+
+    states = part_group.to_state()
+    config = _viewer_config(dict(params), kwargs)
+    config["normal_len"] = get_normal_len(
+        preset("render_normals", params.get("render_normals")), shapes, deviation
+    )
+
+    with Timer(timeit, "", "create data obj", 1) as t:
         data = {
-            "data": numpy_to_buffer_json(
-                dict(instances=instances, shapes=shapes, states=states)
-            ),
+            "data": dict(instances=[], shapes=shapes, states=states),
             "type": "data",
+            "lazy": True,
             "config": config,
-            "count": count_shapes,
+            "count": part_group.count_shapes(),
+        }
+        if format == "json":
+            data["data"] = numpy_to_buffer_json(data["data"])
+        else:
+            data = encode_binary(data, ALIGNMENTS[format])
+            t.bytes = len(data)
+
+    return LazyScene(data, nodes, assembly_instances, params, format, OCP_LOCK)
+
+
+def _convert_incremental(
+    *cad_objs,
+    names=None,
+    colors=None,
+    alphas=None,
+    progress=None,
+    serializer=SERIALIZER,
+    **kwargs,
+):
+    """Add cad_objs to the scene of the former calls.
+
+    Only cad_objs get converted, tessellated and encoded, the payload is merged
+    from the encoded objects of the former calls. Returns None if the
+    tessellation parameters have changed and the scene needs to be rebuilt.
+    """
+    state = serializer.incremental
+
+    with OCP_LOCK:
+        part_group, params, timeit = _prepare(
+            *cad_objs,
+            names=names,
+            colors=colors,
+            alphas=alphas,
+            progress=progress,
+            instances=state["assembly_instances"],
+            serializer=serializer,
+            **kwargs,
+        )
+
+        key = [preset(k, params.get(k)) for k in INCREMENTAL_PARAMS] + [
+            oc.FACE_COLOR,
+            oc.THICK_EDGE_COLOR,
+            oc.VERTEX_COLOR,
+        ]
+        if state["key"] is not None and key != state["key"]:
+            return None
+
+        # same names as to_assembly would create for all objects of the scene
+        obj_names = [obj.name for obj in part_group.objects]
+        unique_names = set(state["unique_names"])
+        for obj, name in zip(
+            part_group.objects,
+            make_unique(state["names"] + obj_names)[len(state["names"]) :],
+        ):
+            # names to_assembly made unique within this call can still collide
+            unique, count = name, 1
+            while unique in unique_names:
+                count += 1
+                unique = f"{name}({count})"
+            unique_names.add(unique)
+            obj.name = unique
+
+        # instances added by with_instances cannot be matched by to_assembly
+        state["assembly_instances"].extend(
+            (None, instance.shape)
+            for instance in co.INSTANCES[len(state["assembly_instances"]) :]
+        )
+
+        with Timer(timeit, "", "tessellate", 1):
+            if params.get("parallel"):
+                start_pool()
+
+            instances, shapes, states = _tessellate_part_group(
+                part_group, params, progress
+            )
+
+    with Timer(timeit, "", "merge", 1):
+        state["bb"], state["normal_len"] = _update_bounds(
+            shapes, params, state["bb"], state["normal_len"]
+        )
+
+        quantize = preset("quantize", params.get("quantize"))
+        if quantize:
+            _, shapes = quantize_meshes([], shapes)
+
+        encoded = state["instances"]
+        encoded.extend([None] * (len(instances) - len(encoded)))
+        new_meshes = []
+        for ref in set(_refs(shapes)):
+            if encoded[ref] is None:
+                mesh = instances[ref]
+                new_meshes.append(mesh)
+                encoded[ref] = numpy_to_buffer_json(
+                    quantize_mesh(mesh) if quantize else mesh
+                )
+
+        state["parts"].extend(numpy_to_buffer_json(shapes["parts"]))
+        state["names"].extend(obj_names)
+        state["unique_names"] = unique_names
+        state["states"].update(states)
+        state["count"] += part_group.count_shapes()
+        count_parts(part_group.count_shapes(), new_meshes)
+        state["key"] = key
+
+        config = _viewer_config(dict(params), kwargs)
+        config["normal_len"] = state["normal_len"]
+
+        data = {
+            "data": {
+                "instances": list(encoded),
+                "shapes": {
+                    "parts": list(state["parts"]),
+                    "loc": shapes["loc"],
+                    "name": shapes["name"],
+                    "id": shapes["id"],
+                    "bb": (
+                        BoundingBox() if state["bb"] is None else state["bb"]
+                    ).to_dict(),
+                },
+                "states": dict(state["states"]),
+            },
+            "type": "data",
+            "config": config,
+            "count": state["count"],
         }
 
     return data
@@ -274,6 +913,36 @@ def align_attrs(attr_list, length, default, tag, explode=True):
         return attr_list
 
 
+def _align_colors(count, colors, alphas, map_colors=None):
+    # Handle colormaps, map_colors are the first colors of the colormap if known
+
+    if isinstance(colors, BaseColorMap):
+        colors = [next(colors) for _ in range(count)]
+        alphas = [None] * count  # alpha is encoded in colors
+    else:
+        colors = align_attrs(colors, count, None, "colors")
+        alphas = align_attrs(alphas, count, None, "alphas")
+
+    if map_colors is None and any(color is None for color in colors):
+        colormap = get_colormap()
+        if colormap is not None:
+            map_colors = [next(colormap) for _ in range(count)]
+
+    for i in range(count):
+        if isinstance(colors[i], str):
+            colors[i] = web_to_rgb(colors[i])
+        if colors[i] is None and map_colors is not None:
+            colors[i] = map_colors[i][:3]
+            if alphas[i] is None and len(map_colors[i]) == 4:
+                alphas[i] = map_colors[i][3]
+        elif colors[i] is not None:
+            if alphas[i] is None and len(colors[i]) == 4:
+                alphas[i] = colors[i][3]
+            colors[i] = colors[i][:3]
+
+    return colors, alphas
+
+
 def show(
     *cad_objs,
     names=None,
@@ -281,6 +950,14 @@ def show(
     alphas=None,
     port=None,
     progress="-+c",
+    format="json",
+    stream=False,
+    delta=False,
+    lod=None,
+    collector=None,
+    serializer=None,
+    out=None,
+    lazy=False,
     glass=None,
     tools=None,
     tree_width=None,
@@ -322,7 +999,11 @@ def show(
     render_joints=None,
     show_parent=None,
     parallel=None,
+    adaptive=None,
+    triangle_budget=None,
+    max_triangles=None,
     helper_scale=None,
+    quantize=None,
     mate_scale=None,  # DEPRECATED
     debug=None,
     timeit=None,
@@ -339,6 +1020,29 @@ def show(
         port:                    The port the viewer listens to. Typically use 'set_port(port)' instead
         progress:                Show progress of tessellation with None is no progress indicator. (default="-+c")
                                  for object: "-": is reference, "+": gets tessellated, "c": from cache
+        format:                  Payload format: "json" returns a dict with hex encoded buffers,
+                                 "binary" returns bytes of a framed binary message, see ocp_vscode.binary,
+                                 "archive" the same with 64 byte aligned buffers for memory mapping,
+                                 see ocp_vscode.archive (default="json")
+        stream:                  Return a generator of messages, one per top level object, instead of one
+                                 payload. The viewer needs the assembled payload, see
+                                 ocp_vscode.stream.assemble_stream (default=False)
+        delta:                   Return only the parts, instances, states and tree changes since the
+                                 last call with delta=True as "delta" message, see ocp_vscode.delta
+                                 (default=False)
+        lod:                     List of deviations, e.g. [1.0, 0.3, 0.1]. The payload holds the finest
+                                 tier as usual and the coarser tiers under "lod", see ocp_vscode.lod.
+                                 Overrides deviation (default=None)
+        collector:               Report the timing spans of this call to collector, e.g. a SpanCollector,
+                                 see ocp_vscode.profiling (default=None)
+        serializer:              The Serializer session holding the state between calls
+                                 (default=None, the module level session)
+        out:                     Write the payload to a path, binary file object or socket instead of
+                                 returning it, one mesh at a time. With stream=True the messages are
+                                 written as JSON Lines, see ocp_vscode.writer (default=None)
+        lazy:                    Return a LazyScene instead of the payload: the shapes tree, states and
+                                 rough bounding boxes without meshes, parts get tessellated on request
+                                 with LazyScene.part(id), see ocp_vscode.lazy (default=False)
 
     Valid keywords to configure the viewer (**kwargs):
     - UI
@@ -397,15 +1101,22 @@ def show(
         render_mates:            Render mates for MAssemblies (default=False)
         render_joints:           Render build123d joints (default=False)
         parallel:                Tessellate objects in parallel (default=False)
+        adaptive:                Coarser tolerances for parts that are small relative to the assembly,
+                                 see ocp_vscode.adaptive (default=False)
+        triangle_budget:         Adaptive mode: maximum number of triangles of all distinct meshes
+                                 (default=None)
+        max_triangles:           Increase deviation and angular_tolerance until the estimated number of
+                                 triangles fits, see ocp_vscode.budget. Chosen values and achieved counts
+                                 are reported in config["budget"] (default=None)
         show_parent:             Render parent of faces, edges or vertices as wireframe
         helper_scale:              Scale of rendered helpers (locations, axis, mates for MAssemblies) (default=1)
+        quantize:                Send positions as uint16 relative to the bounding box of each mesh and normals
+                                 octahedral encoded as 2 x int8, see ocp_vscode.quantize (default=False)
 
     - Debug
         debug:                   Show debug statements to the VS Code browser console (default=False)
         timeit:                  Show timing information from level 0-3 (default=False)
     """
-    global LAST_CALL
-
     # if sys.gettrace() is not None and not _force_in_debug:
     #     print("\nshow and show_object are ignored in debugging sessions\n")
     #     return
@@ -422,71 +1133,167 @@ def show(
             "alphas",
             "port",
             "progress",
-            "LAST_CALL",
+            "format",
+            "stream",
+            "delta",
+            "lod",
+            "collector",
+            "serializer",
+            "out",
+            "lazy",
         ]
     }
 
-    kwargs = check_deprecated(kwargs)
+    if format not in ("json", "binary", "archive"):
+        raise ValueError(
+            f"Unknown format '{format}', use 'json', 'binary' or 'archive'"
+        )
 
-    timeit = preset("timeit", timeit)
+    if stream and format == "archive":
+        raise ValueError("format='archive' cannot be combined with stream=True")
 
-    names = align_attrs(names, len(cad_objs), None, "names", explode=False)
+    if stream and delta:
+        raise ValueError("delta=True cannot be combined with stream=True")
 
-    # Handle colormaps
+    if lod is not None and (stream or delta):
+        raise ValueError("lod cannot be combined with stream=True or delta=True")
 
-    if isinstance(colors, BaseColorMap):
-        colors = [next(colors) for _ in range(len(cad_objs))]
-        alphas = [None] * len(cad_objs)  # alpha is encoded in colors
-    else:
-        colors = align_attrs(colors, len(cad_objs), None, "colors")
-        alphas = align_attrs(alphas, len(cad_objs), None, "alphas")
+    if lod is not None and max_triangles is not None:
+        raise ValueError("lod cannot be combined with max_triangles")
 
-    map_colors = None
-    colormap = get_colormap()
-    if colormap is not None:
-        map_colors = [next(colormap) for _ in range(len(cad_objs))]
+    if out is not None and stream and format != "json":
+        raise ValueError("out with stream=True needs format='json'")
 
-    for i in range(len(cad_objs)):
-        if isinstance(colors[i], str):
-            colors[i] = web_to_rgb(colors[i])
-        if colors[i] is None and map_colors is not None:
-            colors[i] = map_colors[i][:3]
-            if alphas[i] is None and len(map_colors[i]) == 4:
-                alphas[i] = map_colors[i][3]
-        elif colors[i] is not None:
-            if alphas[i] is None and len(colors[i]) == 4:
-                alphas[i] = colors[i][3]
-            colors[i] = colors[i][:3]
+    if lazy and (stream or delta or lod is not None or out is not None or adaptive):
+        raise ValueError(
+            "lazy=True cannot be combined with stream, delta, lod, out or adaptive"
+        )
+
+    if lazy and format == "archive":
+        raise ValueError("format='archive' cannot be combined with lazy=True")
+
+    kwargs = check_deprecated(kwargs)
+
+    timeit = preset("timeit", timeit)
+
+    names = align_attrs(names, len(cad_objs), None, "names", explode=False)
+
+    colors, alphas = _align_colors(len(cad_objs), colors, alphas)
 
     if default_edgecolor is not None:
         default_edgecolor = Color(default_edgecolor).web_color
 
     progress = Progress([] if progress is None else [c for c in progress])
 
-    with Timer(timeit, "", "overall"):
-        data = _convert(
+    if serializer is None:
+        serializer = SERIALIZER
+
+    count_show()
+
+    if stream:
+        data = _convert_stream(
             *cad_objs,
             names=names,
             colors=colors,
             alphas=alphas,
             progress=progress,
+            format=format,
+            serializer=serializer,
             **kwargs,
         )
+        if collector is not None:
+            data = collecting(data, collector)
+        if out is not None:
+            write_stream(data, out)
+            data = None
+    elif lazy:
+        with serializer.lock, collect(collector), Timer(timeit, "", "overall"):
+            data = _convert_lazy(
+                *cad_objs,
+                names=names,
+                colors=colors,
+                alphas=alphas,
+                progress=progress,
+                format=format,
+                serializer=serializer,
+                **kwargs,
+            )
+    else:
+        with serializer.lock, collect(collector), Timer(timeit, "", "overall"):
+            data = _convert(
+                *cad_objs,
+                names=names,
+                colors=colors,
+                alphas=alphas,
+                progress=progress,
+                format=format,
+                delta=delta,
+                lod=lod,
+                serializer=serializer,
+                out=out,
+                **kwargs,
+            )
 
     if not _force_in_debug:
-        LAST_CALL = "show"
+        serializer.last_call = "show"
     else:
-        LAST_CALL = "other"
+        serializer.last_call = "other"
 
     return data
     with Timer(timeit, "", "send"):
         return send_data(data, port=port, timeit=timeit)
 
 
+async def async_show(*cad_objs, executor=None, **kwargs):
+    """Run show() without blocking the asyncio event loop.
+
+    to_assembly, tessellation and encoding run in executor. The module level
+    Serializer keeps state between calls, hence the default executor runs one
+    show() at a time. All other parameters are the same as for show().
+    """
+    loop = asyncio.get_running_loop()
+    # the collectors of the calling task, see ocp_vscode.profiling
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        SHOW_EXECUTOR if executor is None else executor,
+        functools.partial(context.run, show, *cad_objs, **kwargs),
+    )
+
+
 def reset_show():
-    global OBJECTS
+    SERIALIZER.reset_show()
+
+
+def _show_incremental(start, progress, serializer, kwargs):
+    objects = serializer.objects
+
+    if serializer.incremental["objects"] != start:
+        # objects were added without incremental=True
+        serializer.incremental = _incremental_state()
+        start = 0
+
+    for _ in range(2):
+        colors, alphas = _align_colors(
+            len(objects["objs"]) - start,
+            objects["colors"][start:],
+            objects["alphas"][start:],
+        )
+        data = _convert_incremental(
+            *objects["objs"][start:],
+            names=objects["names"][start:],
+            colors=colors,
+            alphas=alphas,
+            progress=progress,
+            serializer=serializer,
+            **kwargs,
+        )
+        if data is not None:
+            serializer.incremental["objects"] = len(objects["objs"])
+            return data
 
-    OBJECTS = {"objs": [], "names": [], "colors": [], "alphas": []}
+        # tessellation parameters have changed, rebuild the scene
+        serializer.incremental = _incremental_state()
+        start = 0
 
 
 def show_object(
@@ -536,11 +1343,18 @@ def show_object(
     render_mates=None,
     render_joints=None,
     parallel=None,
+    adaptive=None,
+    triangle_budget=None,
+    max_triangles=None,
     show_parent=None,
     helper_scale=None,
+    quantize=None,
     mate_scale=None,  # DEPRECATED
     debug=None,
     timeit=None,
+    incremental=False,
+    collector=None,
+    serializer=None,
 ):
     """Incrementally show CAD objects in Visual Studio Code
 
@@ -557,6 +1371,13 @@ def show_object(
         port:                    The port the viewer listens to. Typically use 'set_port(port)' instead
         progress:                Show progress of tessellation with None is no progress indicator. (default="-+c")
                                  for object: "-": is reference, "+": gets tessellated, "c": from cache
+        incremental:             Only convert and tessellate the new object and merge it into the already
+                                 encoded objects of the former calls. The root of the tree is always
+                                 a group, even for one object (default=False)
+        collector:               Report the timing spans of this call to collector, e.g. a SpanCollector,
+                                 see ocp_vscode.profiling (default=None)
+        serializer:              The Serializer session holding the state between calls
+                                 (default=None, the module level session)
 
     Valid keywords to configure the viewer (**kwargs):
     - UI
@@ -615,8 +1436,17 @@ def show_object(
         render_mates:            Render mates for MAssemblies (default=False)
         render_joints:           Render build123d joints (default=False)
         parallel:                Tessellate objects in parallel (default=False)
+        adaptive:                Coarser tolerances for parts that are small relative to the assembly,
+                                 see ocp_vscode.adaptive (default=False)
+        triangle_budget:         Adaptive mode: maximum number of triangles of all distinct meshes
+                                 (default=None)
+        max_triangles:           Increase deviation and angular_tolerance until the estimated number of
+                                 triangles fits, see ocp_vscode.budget. Chosen values and achieved counts
+                                 are reported in config["budget"] (default=None)
         show_parent:             Render parent of faces, edges or vertices as wireframe
         helper_scale:            Scale of rendered helpers (locations, axis, mates for MAssemblies) (default=1)
+        quantize:                Send positions as uint16 relative to the bounding box of each mesh and normals
+                                 octahedral encoded as 2 x int8, see ocp_vscode.quantize (default=False)
 
     - Debug
         debug:                   Show debug statements to the VS Code browser console (default=False)
@@ -627,45 +1457,74 @@ def show_object(
         k: v
         for k, v in locals().items()
         if v is not None
-        and k not in ["obj", "name", "options", "parent", "clear", "port", "progress"]
+        and k
+        not in [
+            "obj",
+            "name",
+            "options",
+            "parent",
+            "clear",
+            "port",
+            "progress",
+            "incremental",
+            "collector",
+            "serializer",
+        ]
     }
 
-    global OBJECTS
-
-    if clear:
-        reset_show()
-
-    if parent is not None:
-        OBJECTS["objs"].append(parent)
-        OBJECTS["names"].append("parent")
-        OBJECTS["colors"].append(None)
-        OBJECTS["alphas"].append(None)
-
-    color = None
-    alpha = None
-    if options is None:
-        colormap = get_colormap()
-        if colormap is not None:
-            for _ in range(len(OBJECTS["names"]) + 1):
-                *color, alpha = next(colormap)
-    else:
-        color = options.get("color")
-        alpha = options.get("alpha", 1.0)
-
-    OBJECTS["objs"].append(obj)
-    OBJECTS["names"].append(name)
-    OBJECTS["colors"].append(color)
-    OBJECTS["alphas"].append(alpha)
-
-    show(
-        *OBJECTS["objs"],
-        names=OBJECTS["names"],
-        colors=OBJECTS["colors"],
-        alphas=OBJECTS["alphas"],
-        port=port,
-        progress=progress,
-        **kwargs,
-    )
+    if serializer is None:
+        serializer = SERIALIZER
+
+    with serializer.lock:
+        if clear:
+            serializer.reset_show()
+
+        objects = serializer.objects
+        start = len(objects["objs"])
+
+        if parent is not None:
+            objects["objs"].append(parent)
+            objects["names"].append("parent")
+            objects["colors"].append(None)
+            objects["alphas"].append(None)
+
+        color = None
+        alpha = None
+        if options is None:
+            colormap = get_colormap()
+            if colormap is not None:
+                for _ in range(len(objects["names"]) + 1):
+                    *color, alpha = next(colormap)
+        else:
+            color = options.get("color")
+            alpha = options.get("alpha", 1.0)
+
+        objects["objs"].append(obj)
+        objects["names"].append(name)
+        objects["colors"].append(color)
+        objects["alphas"].append(alpha)
+
+        if incremental:
+            kwargs = check_deprecated(kwargs)
+            timeit = preset("timeit", timeit)
+            progress = Progress([] if progress is None else [c for c in progress])
+
+            count_show()
+
+            with collect(collector), Timer(timeit, "", "overall"):
+                return _show_incremental(start, progress, serializer, kwargs)
+
+        return show(
+            *objects["objs"],
+            names=objects["names"],
+            colors=objects["colors"],
+            alphas=objects["alphas"],
+            port=port,
+            progress=progress,
+            collector=collector,
+            serializer=serializer,
+            **kwargs,
+        )
 
 
 def show_clear():
@@ -678,10 +1537,8 @@ def show_clear():
 def show_all(variables=None, exclude=None, **kwargs):
     import inspect
 
-    global FIRST_CALL, LAST_CALL
-
-    if LAST_CALL == "show":
-        LAST_CALL = "other"
+    if SERIALIZER.last_call == "show":
+        SERIALIZER.last_call = "other"
         print("\nSkip visual debug step after a show() command")
         return
 
@@ -747,7 +1604,7 @@ def show_all(variables=None, exclude=None, **kwargs):
                 objects.append(pg)
                 names.append(name)
 
-    if FIRST_CALL:
+    if SERIALIZER.first_call:
         kwargs["reset_camera"] = Camera.RESET
 
     if len(objects) > 0:
@@ -758,6 +1615,6 @@ def show_all(variables=None, exclude=None, **kwargs):
             _force_in_debug=True,
             **kwargs,
         )
-        FIRST_CALL = False
+        SERIALIZER.first_call = False
     else:
         show_clear()
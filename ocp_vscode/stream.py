@@ -0,0 +1,61 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from .binary import decode_binary, is_binary
+
+__all__ = ["assemble_stream"]
+
+
+def assemble_stream(messages):
+    """Reference client for show(..., stream=True): merges the ordered stream
+    messages into the payload that show() returns without streaming"""
+    data = None
+    instances = {}
+    states = {}
+    seq = 0
+
+    for message in messages:
+        if is_binary(message):
+            message = decode_binary(message)
+
+        if message["seq"] != seq:
+            raise ValueError(f"Expected message {seq}, got {message['seq']}")
+        seq += 1
+
+        if message["type"] == "stream_start":
+            data = {
+                "data": {"instances": [], "shapes": message["shapes"], "states": {}},
+                "type": "data",
+                "config": message["config"],
+                "count": message["count"],
+            }
+
+        elif message["type"] == "stream_chunk":
+            chunk = message["data"]
+            instances.update({int(k): v for k, v in chunk["instances"].items()})
+            data["data"]["shapes"]["parts"].append(chunk["shapes"])
+            states.update(chunk["states"])
+
+        elif message["type"] == "stream_end":
+            data["data"]["shapes"]["bb"] = message["bb"]
+            data["config"]["normal_len"] = message["normal_len"]
+            data["data"]["instances"] = [
+                instances.get(i) for i in range(max(instances, default=-1) + 1)
+            ]
+            data["data"]["states"] = states
+            return data
+
+    raise ValueError("Stream ended without 'stream_end' message")
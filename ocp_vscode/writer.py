@@ -0,0 +1,116 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Write show() payloads to files and sockets, see show(..., out=...)
+
+format="json" writes the same bytes as orjson.dumps(show(...)), but the meshes
+are encoded and written one at a time, so the encoded payload never exists in
+memory as a whole. format="binary" and "archive" write the message of
+encode_binary buffer by buffer. With stream=True every message of the stream is written as one line of
+JSON (JSON Lines), to be read back e.g. with
+
+    assemble_stream(orjson.loads(line) for line in open(path, "rb"))
+"""
+
+import os
+import socket
+
+import orjson as json
+from ocp_tessellate.utils import numpy_to_buffer_json
+
+from .binary import ALIGNMENTS, write_binary
+
+__all__ = ["write_payload", "write_stream"]
+
+
+class _Output:
+    """Write bytes to a path, a binary file object or a socket and count them"""
+
+    def __init__(self, out):
+        self.out = out
+        self.fd = None
+        self.bytes = 0
+
+    def __enter__(self):
+        if isinstance(self.out, (str, os.PathLike)):
+            self.fd = open(self.out, "wb")
+        elif isinstance(self.out, socket.socket):
+            self.fd = self.out.makefile("wb")
+        else:
+            self.fd = self.out
+        return self
+
+    def write(self, data):
+        self.fd.write(data)
+        self.bytes += len(data)
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.fd.flush()
+        if self.fd is not self.out:
+            self.fd.close()
+
+
+# parts of the payload that are written element by element, values without a
+# spec are encoded at once
+PIECEWISE = {"data": {"instances": {}, "lod": {"instances": {}}}}
+
+
+def _write(value, write, spec):
+    if spec is None:
+        write(json.dumps(numpy_to_buffer_json(value)))
+
+    elif isinstance(value, dict):
+        write(b"{")
+        for i, (key, item) in enumerate(value.items()):
+            if i > 0:
+                write(b",")
+            write(json.dumps(key) + b":")
+            _write(item, write, spec.get(key))
+        write(b"}")
+
+    elif isinstance(value, list):
+        # the spec applies to every element
+        write(b"[")
+        for i, item in enumerate(value):
+            if i > 0:
+                write(b",")
+            _write(item, write, spec)
+        write(b"]")
+
+    else:
+        write(json.dumps(numpy_to_buffer_json(value)))
+
+
+def write_payload(data, out, format="json"):
+    """Write the payload data of show() (with numpy arrays, before encoding) to
+    out, a path, binary file object or socket. Returns the number of bytes"""
+    with _Output(out) as output:
+        if format == "json":
+            _write(data, output.write, PIECEWISE)
+        else:
+            write_binary(data, output.write, ALIGNMENTS[format])
+
+    return output.bytes
+
+
+def write_stream(messages, out):
+    """Write the encoded messages of show(..., stream=True) as JSON Lines to out.
+    Returns the number of bytes"""
+    with _Output(out) as output:
+        for message in messages:
+            output.write(json.dumps(message) + b"\n")
+
+    return output.bytes
@@ -13,6 +13,7 @@ setup_args = {
         "orjson",
         "websockets>=11.0,<11.1",
     ],
+    "extras_require": {"zstd": ["zstandard"]},
     "packages": find_packages(),
     "zip_safe": False,
     "author": "Bernhard Walter",
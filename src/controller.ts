@@ -20,12 +20,19 @@ import { CadqueryViewer } from "./viewer";
 import { template } from "./display";
 import { createServer, Server } from 'http';
 import { WebSocket, WebSocketServer } from 'ws';
+import * as zlib from "zlib";
 import * as output from "./output";
 import { logo } from "./logo";
 import { StatusManagerProvider } from "./statusManager";
 
 var serverStarted = false;
 
+// zstd is part of the zlib module since Node 22.15 / 23.8
+const zstdDecompressSync: ((buffer: Buffer) => Buffer) | undefined =
+    (zlib as any).zstdDecompressSync;
+
+const CODECS = zstdDecompressSync === undefined ? ["zlib"] : ["zlib", "zstd"];
+
 interface Message {
     type: string;
     action: string;
@@ -144,8 +151,21 @@ export class CadqueryController {
             wss.on('connection', (socket) => {
                 output.info('Client connected');
 
-                socket.on('message', (message) => {
+                socket.on('message', (message: Buffer) => {
                     try {
+                        if (message.subarray(0, 2).toString() === "Z:") {
+                            // compressed message "Z:<codec>:<compressed message>"
+                            const end = message.indexOf(":", 2);
+                            const codec = message.subarray(2, end).toString();
+                            const compressed = message.subarray(end + 1);
+                            if (codec === "zlib") {
+                                message = zlib.inflateSync(compressed);
+                            } else if (codec === "zstd" && zstdDecompressSync !== undefined) {
+                                message = zstdDecompressSync(compressed);
+                            } else {
+                                throw new Error(`Unsupported codec ${codec}`);
+                            }
+                        }
                         const raw_data = message.toString()
                         const messageType = raw_data.substring(0, 1)
                         var data = message.toString().substring(2);
@@ -155,6 +175,8 @@ export class CadqueryController {
                                 socket.send(this.viewer_message);
                             } else if (data === "config") {
                                 socket.send(JSON.stringify(this.config()));
+                            } else if (data === "codecs") {
+                                socket.send(JSON.stringify(CODECS));
                             }
 
                         } else if (messageType === "D") {
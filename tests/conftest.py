@@ -0,0 +1,52 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# pylint: disable=wrong-import-position,no-name-in-module
+from OCP.BRepAlgoAPI import BRepAlgoAPI_Cut
+from OCP.BRepPrimAPI import BRepPrimAPI_MakeBox, BRepPrimAPI_MakeCylinder
+from ocp_tessellate.tessellator import cache as tessellator_cache
+
+from ocp_vscode import clear_cache, reset_show, set_cache_dir
+
+
+def make_box(x=1.0, y=2.0, z=3.0):
+    return BRepPrimAPI_MakeBox(x, y, z).Shape()
+
+
+def make_part(size=1.0):
+    """A box with a hole, more than one face type"""
+    box = BRepPrimAPI_MakeBox(size, size, 1.0).Shape()
+    hole = BRepPrimAPI_MakeCylinder(size / 4, 1.0).Shape()
+    return BRepAlgoAPI_Cut(box, hole).Shape()
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Every test starts with empty caches and a fresh module level session"""
+    set_cache_dir(None)
+    clear_cache()
+    tessellator_cache.clear()
+    reset_show()
+    yield
+    set_cache_dir(None)
+    clear_cache()
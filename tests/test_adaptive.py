@@ -0,0 +1,64 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+from ocp_tessellate.ocp_utils import BoundingBox
+
+from ocp_vscode import show
+from ocp_vscode.adaptive import MAX_FACTOR, adaptive_factors
+
+from conftest import make_part
+
+
+def _bb(size):
+    return BoundingBox(
+        {"xmin": 0, "xmax": size, "ymin": 0, "ymax": size, "zmin": 0, "zmax": size}
+    )
+
+
+def test_factors():
+    factors = adaptive_factors({"small": _bb(1.0), "large": _bb(100.0)})
+
+    assert factors["large"] == pytest.approx(1.0)
+    assert factors["small"] == MAX_FACTOR
+    assert adaptive_factors({}) == {}
+
+
+def _triangles(payload):
+    return [
+        len(instance["triangles"]) // 3 for instance in payload["data"]["instances"]
+    ]
+
+
+def test_small_parts_get_coarser():
+    parts = [make_part(1.0), make_part(50.0)]
+    default = show(*parts, progress=None)
+    adaptive = show(*parts, adaptive=True, progress=None)
+
+    small, large = _triangles(adaptive)
+    assert small < _triangles(default)[0]
+    assert large == _triangles(default)[1]
+
+
+def test_budget():
+    parts = [make_part(size) for size in (1.0, 5.0, 20.0)]
+    kwargs = {"adaptive": True, "deviation": 0.01, "angular_tolerance": 0.05}
+    unlimited = sum(_triangles(show(*parts, progress=None, **kwargs)))
+
+    budget = unlimited * 2 // 3
+    payload = show(*parts, max_triangles=budget, progress=None, **kwargs)
+    # ADAPTIVE_ROUNDS meshing rounds, the last one may overshoot slightly
+    assert sum(_triangles(payload)) <= budget * 1.05
@@ -0,0 +1,102 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+import pytest
+
+from ocp_vscode import open_archive, save_archive, show
+from ocp_vscode.binary import ALIGNMENTS, _read_header, decode_binary, encode_binary
+
+from conftest import make_box, make_part
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    path = tmp_path / "scene.ocpb"
+    save_archive(path, make_part(), make_box(), names=["part", "box"], progress=None)
+    return path
+
+
+def _assert_equal(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            _assert_equal(a[key], b[key])
+    elif isinstance(a, (list, tuple)):
+        assert len(a) == len(b)
+        for x, y in zip(a, b):
+            _assert_equal(x, y)
+    elif isinstance(a, np.ndarray):
+        assert a.dtype == b.dtype
+        np.testing.assert_array_equal(a, b)
+    else:
+        assert a == b
+
+
+def test_file_equals_show(archive_path):
+    message = show(
+        make_part(), make_box(), names=["part", "box"], format="archive", progress=None
+    )
+    assert archive_path.read_bytes() == message
+
+    _, start, offsets = _read_header(message)
+    assert start % 64 == 0
+    assert all(offset % 64 == 0 for offset, _ in offsets)
+
+
+def test_payload_round_trip(archive_path):
+    expected = decode_binary(archive_path.read_bytes())
+    with open_archive(archive_path) as archive:
+        _assert_equal(archive.payload(), expected)
+        assert archive.config == expected["config"]
+        assert archive.states == expected["data"]["states"]
+        assert archive.bb == expected["data"]["shapes"]["bb"]
+
+
+def test_parts_resolve_instances(archive_path):
+    with open_archive(archive_path) as archive:
+        assert "/Group/part" in archive.ids() and "/Group/box" in archive.ids()
+        payload = archive.payload()
+
+        part = archive.part("/Group/part")
+        ref = next(
+            p["shape"]["ref"]
+            for p in payload["data"]["shapes"]["parts"]
+            if p["id"] == "/Group/part"
+        )
+        _assert_equal(part["shape"], archive.instance(ref))
+        assert part["shape"]["vertices"].size > 0
+
+        group = archive.part("/Group")
+        assert [p["id"] for p in group["parts"]] == ["/Group/part", "/Group/box"]
+
+
+def test_views_and_copies(archive_path):
+    with open_archive(archive_path) as archive:
+        view = archive.instance(0)["vertices"]
+        assert not view.flags.writeable
+
+        copy = archive.instance(0, copy=True)["vertices"]
+        copy[:] = 0
+        assert np.any(archive.instance(0)["vertices"] != 0)
+        del view
+
+
+def test_only_data_messages(tmp_path):
+    path = tmp_path / "clear.ocpb"
+    path.write_bytes(encode_binary({"type": "clear"}, ALIGNMENTS["archive"]))
+    with pytest.raises(ValueError, match="'clear'"):
+        open_archive(path)
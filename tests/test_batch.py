@@ -0,0 +1,89 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+from ocp_tessellate.ocp_utils import get_edges
+from ocp_tessellate.tessellator import cache as tessellator_cache
+
+from ocp_vscode import Serializer, show_batch, shutdown_pool
+
+from conftest import make_box, make_part
+
+SCENES = 40
+
+
+def _scene(i):
+    """Scene i of shapes that only live as long as the scene, so that later
+    scenes reuse their memory (and ids)"""
+    size = 1.0 + (i % 7) * 0.5
+    if i % 3 == 0:
+        return make_part(size)
+    return {
+        "cad_objs": [make_part(size), list(get_edges(make_box(size, size, size)))],
+        "names": ["part", "edges"],
+    }
+
+
+def _show(scene):
+    if isinstance(scene, dict):
+        return Serializer().show(
+            *scene["cad_objs"], names=scene["names"], progress=None
+        )
+    return Serializer().show(scene, progress=None)
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_results_equal_show(parallel):
+    # the scenes are created while the batch runs and freed after their results
+    scenes = (_scene(i) for i in range(SCENES))
+    try:
+        results = sorted(
+            show_batch(scenes, workers=3, parallel=parallel), key=lambda r: r.index
+        )
+    finally:
+        shutdown_pool()
+
+    assert [result.index for result in results] == list(range(SCENES))
+    for i, result in enumerate(results):
+        assert result.error is None
+        assert result.data["data"] == _show(_scene(i))["data"]
+
+    assert len(tessellator_cache) == 0
+
+
+def test_scenes_do_not_share_state():
+    # one thread and no pool, scenes run one after the other
+    for result in show_batch(
+        (_scene(i) for i in range(SCENES)), workers=1, parallel=False
+    ):
+        expected = _show(_scene(result.index))
+        assert result.data["data"]["shapes"] == expected["data"]["shapes"]
+
+
+def test_errors_do_not_stop_the_batch():
+    scenes = [make_box(), {"names": ["missing cad_objs"]}, make_box(2, 2, 2)]
+    results = sorted(
+        show_batch(scenes, workers=2, parallel=False), key=lambda r: r.index
+    )
+
+    assert results[0].error is None and results[2].error is None
+    assert isinstance(results[1].error, KeyError)
+    assert results[1].data is None
+
+
+def test_stream_is_refused():
+    with pytest.raises(ValueError):
+        list(show_batch([make_box()], stream=True))
@@ -0,0 +1,116 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+import pytest
+from ocp_tessellate.utils import numpy_to_buffer_json
+
+from ocp_vscode import show
+from ocp_vscode.binary import (
+    ALIGNMENTS,
+    _read_header,
+    decode_binary,
+    encode_binary,
+    is_binary,
+    write_binary,
+)
+
+from conftest import make_part
+
+
+def _payload():
+    return {
+        "type": "data",
+        "data": {
+            "instances": [
+                {
+                    "vertices": np.arange(9, dtype="float32"),
+                    "triangles": np.arange(3, dtype="uint32"),
+                    "normals": np.array([1, -1, 0, 127], dtype="int8"),
+                    "edges": np.zeros(0, dtype="float32"),
+                },
+                None,
+            ],
+            "matrix": np.arange(6, dtype=">f8").reshape(2, 3),
+            "loc": ((1.0, 2.0, 3.0), (0.0, 0.0, 0.0, 1.0)),
+            "name": "box",
+        },
+    }
+
+
+@pytest.mark.parametrize("alignment", [8, 64])
+def test_round_trip(alignment):
+    data = _payload()
+    message = encode_binary(data, alignment)
+    assert is_binary(message)
+
+    decoded = decode_binary(message)
+    instance = decoded["data"]["instances"][0]
+    for key, array in data["data"]["instances"][0].items():
+        assert instance[key].dtype == array.dtype
+        np.testing.assert_array_equal(instance[key], array)
+
+    assert decoded["data"]["instances"][1] is None
+    assert decoded["data"]["matrix"].dtype == np.dtype("<f8")
+    np.testing.assert_array_equal(decoded["data"]["matrix"], data["data"]["matrix"])
+    # tuples come back as lists like from JSON
+    assert decoded["data"]["loc"] == [[1.0, 2.0, 3.0], [0.0, 0.0, 0.0, 1.0]]
+    assert decoded["data"]["name"] == "box"
+
+
+@pytest.mark.parametrize("alignment", [8, 64])
+def test_alignment(alignment):
+    message = encode_binary(_payload(), alignment)
+    _, start, offsets = _read_header(message)
+
+    assert start % alignment == 0
+    assert all(offset % alignment == 0 for offset, _ in offsets)
+
+
+def test_views_and_copies():
+    message = encode_binary(_payload())
+
+    view = decode_binary(message)["data"]["instances"][0]["vertices"]
+    assert not view.flags.writeable
+
+    copy = decode_binary(message, copy=True)["data"]["instances"][0]["vertices"]
+    copy[0] = 42
+    assert decode_binary(message)["data"]["instances"][0]["vertices"][0] == 0
+
+
+def test_write_binary_matches_encode_binary():
+    chunks = []
+    size = write_binary(_payload(), chunks.append, ALIGNMENTS["archive"])
+
+    message = b"".join(bytes(chunk) for chunk in chunks)
+    assert message == encode_binary(_payload(), ALIGNMENTS["archive"])
+    assert size == len(message)
+
+
+def test_invalid_messages():
+    assert not is_binary(b'D:{"type": "data"}')
+    with pytest.raises(ValueError):
+        decode_binary(b"XXXX" + encode_binary(_payload())[4:])
+
+
+def test_show_binary_equals_json():
+    part = make_part()
+    payload = show(part, progress=None)
+    message = show(part, format="binary", progress=None)
+
+    decoded = decode_binary(message)
+    decoded["data"] = numpy_to_buffer_json(decoded["data"])
+    assert decoded == payload
@@ -0,0 +1,59 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+
+from ocp_vscode import show
+
+from conftest import make_part
+
+QUALITY = {"deviation": 0.01, "angular_tolerance": 0.05}
+
+
+def _parts():
+    return [make_part(size) for size in (1.0, 5.0, 20.0)]
+
+
+def test_within_budget_keeps_tolerances():
+    budget = show(*_parts(), max_triangles=100_000, progress=None, **QUALITY)["config"][
+        "budget"
+    ]
+
+    assert budget["deviation"] == QUALITY["deviation"]
+    assert budget["angular_tolerance"] == QUALITY["angular_tolerance"]
+    assert budget["triangles"] == budget["estimated_triangles"]
+
+
+@pytest.mark.parametrize("max_triangles", [300, 150])
+def test_tolerances_grow_to_fit(max_triangles):
+    budget = show(*_parts(), max_triangles=max_triangles, progress=None, **QUALITY)[
+        "config"
+    ]["budget"]
+
+    assert budget["max_triangles"] == max_triangles
+    assert budget["deviation"] > QUALITY["deviation"]
+    assert budget["angular_tolerance"] > QUALITY["angular_tolerance"]
+    assert budget["triangles"] <= max_triangles
+
+
+def test_default_tolerances():
+    budget = show(*_parts(), max_triangles=1000, progress=None)["config"]["budget"]
+    assert budget["deviation"] >= 0.1
+    assert budget["triangles"] <= 1000
+
+
+def test_no_budget():
+    assert "budget" not in show(*_parts(), progress=None)["config"]
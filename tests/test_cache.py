@@ -0,0 +1,236 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+# pylint: disable=no-name-in-module
+from OCP.gp import gp_Trsf, gp_Vec
+from OCP.TopLoc import TopLoc_Location
+from ocp_tessellate.tessellator import cache as tessellator_cache
+
+from ocp_vscode import clear_cache, get_cache_info, set_cache_dir, show, show_object
+from ocp_vscode.cache import DiskCache, TessellationCache, shape_digest
+
+from conftest import make_box, make_part
+
+ROOT = os.path.join(os.path.dirname(__file__), os.pardir)
+
+
+def _moved(shape, x):
+    trsf = gp_Trsf()
+    trsf.SetTranslation(gp_Vec(x, 0, 0))
+    return shape.Moved(TopLoc_Location(trsf))
+
+
+def test_shape_digest():
+    part = make_part()
+
+    # equal shapes built the same way
+    assert shape_digest(part) == shape_digest(make_part())
+    assert shape_digest(part) != shape_digest(make_part(2.0))
+    assert shape_digest(part) != shape_digest(_moved(part, 1.0))
+    assert shape_digest(make_box()) != shape_digest(make_box(z=3.001))
+
+
+def test_shape_digest_ignores_meshing():
+    part = make_part()
+    before = shape_digest(part)
+    show(part, progress=None)
+
+    assert shape_digest(part) == before
+    assert shape_digest(part) == shape_digest(make_part())
+
+
+def test_shape_digest_is_stable_across_processes():
+    # the disk tier is shared between processes
+    code = (
+        "import sys; sys.path.insert(0, 'tests'); "
+        "from conftest import make_part; "
+        "from ocp_vscode.cache import shape_digest; "
+        "print(shape_digest(make_part()).hex())"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split()[-1] == shape_digest(make_part()).hex()
+
+
+def _entry():
+    mesh = {"vertices": np.zeros(9, dtype="float32")}
+    shapes = {"parts": [{"id": "/Group/box", "shape": {"ref": 0}, "bb": {}}]}
+    return ([mesh], shapes, {"/Group/box": [1, 1]})
+
+
+def test_get_returns_copies():
+    cache = TessellationCache(1024 * 1024)
+    cache.put("key", _entry())
+
+    first = cache.get("key")
+    del first[1]["parts"][0]["bb"]
+    first[2].clear()
+
+    second = cache.get("key")
+    assert "bb" in second[1]["parts"][0]
+    assert second[2] == {"/Group/box": [1, 1]}
+    # buffers are shared, not copied
+    assert second[0][0]["vertices"] is first[0][0]["vertices"]
+
+
+def test_put_stores_a_copy():
+    cache = TessellationCache(1024 * 1024)
+    entry = _entry()
+    cache.put("key", entry)
+    del entry[1]["parts"][0]["bb"]
+
+    assert "bb" in cache.get("key")[1]["parts"][0]
+
+
+def test_lru_eviction():
+    size = _entry()[0][0]["vertices"].nbytes
+    cache = TessellationCache(2 * size)
+    cache.put("a", _entry())
+    cache.put("b", _entry())
+    cache.get("a")
+    cache.put("c", _entry())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_show_twice():
+    box = make_box()
+    first = show(box, progress=None)
+    second = show(box, progress=None)
+
+    assert first == second
+    assert get_cache_info()["hits"] == 1
+
+
+def test_hit_and_miss():
+    show(make_box(), progress=None)
+    assert get_cache_info()["misses"] == 1
+    assert get_cache_info()["hits"] == 0
+
+    # equal shape, different object
+    show(make_box(), progress=None)
+    assert get_cache_info()["hits"] == 1
+
+    show(make_box(2, 2, 2), progress=None)
+    assert get_cache_info()["misses"] == 2
+
+
+def test_parameter_change_misses():
+    part = make_part()
+    coarse = show(part, deviation=1.0, progress=None)
+    fine = show(part, deviation=0.01, progress=None)
+
+    assert get_cache_info()["misses"] == 2
+    assert coarse["data"]["instances"] != fine["data"]["instances"]
+
+
+def test_meshes_are_cached_per_shape():
+    show(make_box(), make_part(), make_part(2.0), progress=None)
+    assert get_cache_info()["misses"] == 3
+
+    # only the changed shape gets tessellated
+    show(make_box(), make_part(), make_part(3.0), progress=None)
+    assert get_cache_info()["misses"] == 4
+    assert get_cache_info()["hits"] == 2
+
+
+def test_ocp_tessellate_cache_is_not_used():
+    # it is keyed by id() of the shapes, which get reused by later shapes
+    for size in (1.0, 2.0, 3.0):
+        show(make_part(size), progress=None)
+        show(make_part(size), adaptive=True, max_triangles=100, progress=None)
+
+    assert len(tessellator_cache) == 0
+
+
+def test_adaptive_budget_change():
+    parts = [make_part(size) for size in (1.0, 5.0, 20.0)]
+    small = show(*parts, adaptive=True, max_triangles=100, progress=None)
+    large = show(*parts, adaptive=True, max_triangles=20000, progress=None)
+    assert small["data"]["instances"] != large["data"]["instances"]
+
+    # the repeated search finds all meshes in the cache
+    misses = get_cache_info()["misses"]
+    again = show(*parts, adaptive=True, max_triangles=20000, progress=None)
+    assert get_cache_info()["misses"] == misses
+    assert again == large
+
+
+def test_repeated_stream_lod_and_incremental():
+    part = make_part()
+    for _ in range(2):
+        list(show(part, stream=True, progress=None))
+        show(part, lod=[1.0, 0.1], progress=None)
+        show_object(part, clear=True, incremental=True, progress=None)
+
+
+def test_disk_tier(tmp_path):
+    set_cache_dir(str(tmp_path))
+    part = make_part()
+    first = show(part, progress=None)
+
+    # memory tier emptied, the result comes from disk
+    clear_cache()
+    second = show(part, progress=None)
+    third = show(part, progress=None)
+
+    assert get_cache_info()["disk_hits"] == 1
+    assert first == second == third
+
+
+def test_disk_tier_tracks_its_size(tmp_path):
+    mesh = {"vertices": np.zeros(1000, dtype="float32")}
+    disk = DiskCache(str(tmp_path), 1024 * 1024)
+    scans = []
+    entries = disk._entries
+    disk._entries = lambda: scans.append(1) or entries()
+
+    for i in range(20):
+        disk.put(f"{i:04d}", mesh)
+
+    # below maxsize the folder is not scanned
+    assert not scans
+    assert disk.size == disk.info()["size"]
+
+
+def test_disk_tier_prunes_oldest(tmp_path):
+    mesh = {"vertices": np.zeros(1000, dtype="float32")}
+    disk = DiskCache(str(tmp_path), 1024 * 1024)
+    disk.put("first", mesh)
+    os.utime(os.path.join(disk._folder("first"), "index.json"), (0, 0))
+    disk.maxsize = 10 * disk.size
+
+    for i in range(20):
+        disk.put(f"{i:04d}", mesh)
+
+    assert disk.get("first") is None
+    assert disk.get("0019") is not None
+    assert disk.size == disk.info()["size"] <= disk.maxsize
+    # reopening the folder finds the same size
+    assert DiskCache(str(tmp_path), disk.maxsize).size == disk.size
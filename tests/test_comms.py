@@ -0,0 +1,217 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+import time
+
+import pytest
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.server import serve
+
+from ocp_vscode import Serializer, comms, send_data, show
+from ocp_vscode.comms import (
+    Connection,
+    _compress,
+    _maybe_compress,
+    check_viewer_message,
+    decompress_message,
+    get_compression,
+    set_compression,
+)
+from ocp_vscode.stream import assemble_stream
+
+from conftest import make_part
+
+
+def test_viewer_messages_are_accepted():
+    check_viewer_message(show(make_part(), progress=None))
+    check_viewer_message({"type": "clear"})
+    check_viewer_message({"type": "ui", "config": {"axes": True}})
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"format": "binary"},
+        {"stream": True},
+        {"quantize": True},
+        {"lazy": True},
+    ],
+)
+def test_viewer_messages_are_refused(kwargs):
+    data = show(make_part(), progress=None, **kwargs)
+    if kwargs.get("lazy"):
+        data = data.data
+
+    with pytest.raises(ValueError):
+        check_viewer_message(data)
+
+
+def test_stream_and_delta_messages_are_refused():
+    part = make_part()
+    for message in show(part, stream=True, progress=None):
+        with pytest.raises(ValueError):
+            check_viewer_message(message)
+
+    # the assembled stream is a normal payload
+    check_viewer_message(assemble_stream(show(part, stream=True, progress=None)))
+
+    serializer = Serializer()
+    serializer.show(part, delta=True, progress=None)
+    with pytest.raises(ValueError):
+        check_viewer_message(serializer.show(part, delta=True, progress=None))
+
+
+def test_send_data_refuses_before_connecting():
+    # no viewer is listening on this port, the error is raised before connecting
+    with pytest.raises(ValueError, match="binary"):
+        send_data(show(make_part(), format="binary", progress=None), port=1)
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_compression_round_trip(codec):
+    pytest.importorskip("zstandard")
+    message = b'D:{"type": "data"}' * 1000
+    compressed = _compress(message, codec, None)
+
+    assert compressed.startswith(b"Z:" + codec.encode() + b":")
+    assert len(compressed) < len(message)
+    assert decompress_message(compressed) == message
+
+
+@pytest.mark.parametrize(
+    "codecs, prefix",
+    [
+        (["zlib", "zstd"], b"Z:zstd:"),
+        (["zlib"], b"Z:zlib:"),
+        ([], b"D:"),
+    ],
+)
+def test_compression_follows_viewer_codecs(codecs, prefix):
+    pytest.importorskip("zstandard")
+    saved = get_compression()
+    try:
+        set_compression("zstd", level=19, threshold=0)
+        message = b'D:{"type": "data"}' * 1000
+        compressed = _maybe_compress(message, lambda: codecs)
+
+        assert compressed.startswith(prefix)
+        assert decompress_message(compressed) == message
+    finally:
+        set_compression(**saved)
+
+
+class _Viewer:
+    """Local websocket server in place of the viewer. Commands get answered
+    with b"ok" for answer="ok", the connection gets closed for answer="close"
+    and nothing happens for answer=None"""
+
+    def __init__(self, port=0, answer="ok"):
+        self.answer = answer
+        self.messages = []
+        self.connections = []
+        self.server = serve(self._handle, "127.0.0.1", port)
+        self.port = self.server.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def _handle(self, ws):
+        self.connections.append(ws)
+        for message in ws:
+            self.messages.append(message)
+            if not message.startswith(b"C:"):
+                continue
+            if self.answer == "ok":
+                ws.send(b"ok")
+            elif self.answer == "close":
+                ws.close()
+
+    def wait(self, count):
+        deadline = time.monotonic() + 5
+        while len(self.messages) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.messages
+
+    def stop(self):
+        self.server.shutdown()
+        for ws in self.connections:
+            ws.close()
+        self.thread.join()
+
+
+@pytest.fixture
+def viewer():
+    viewers = []
+
+    def start(port=0, answer="ok"):
+        viewers.append(_Viewer(port, answer))
+        return viewers[-1]
+
+    yield start
+    for v in viewers:
+        v.stop()
+
+
+def test_connection_is_reused(viewer):
+    v = viewer()
+    connection = Connection(v.port)
+
+    assert connection.send(b"C:1", response=True) == b"ok"
+    assert connection.send(b"D:2") is None
+    assert v.wait(2) == [b"C:1", b"D:2"]
+    assert len(v.connections) == 1
+    connection.close()
+
+
+def test_connection_survives_viewer_restart(viewer):
+    v = viewer()
+    connection = Connection(v.port)
+    connection.send(b"D:1")
+    assert v.wait(1) == [b"D:1"]
+
+    v.stop()
+    restarted = viewer(v.port)
+
+    assert connection.send(b"C:2", response=True) == b"ok"
+    assert restarted.wait(1) == [b"C:2"]
+    connection.close()
+
+
+def test_failed_answer_does_not_resend(viewer):
+    v = viewer(answer="close")
+    connection = Connection(v.port)
+
+    with pytest.raises(ConnectionClosed):
+        connection.send(b"C:1", response=True)
+
+    assert v.wait(1) == [b"C:1"]
+    assert len(v.connections) == 1
+    assert connection.ws is None
+
+
+def test_answer_times_out(viewer, monkeypatch):
+    monkeypatch.setattr(comms, "RECV_TIMEOUT", 0.2)
+    v = viewer(answer=None)
+    connection = Connection(v.port)
+
+    with pytest.raises(TimeoutError):
+        connection.send(b"C:1", response=True)
+
+    assert v.wait(1) == [b"C:1"]
+    # the lock is released and the connection with the pending answer dropped
+    assert connection.lock.acquire(blocking=False)
+    connection.lock.release()
+    assert connection.ws is None
@@ -0,0 +1,101 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+
+# pylint: disable=no-name-in-module
+from OCP.BRepBuilderAPI import BRepBuilderAPI_Copy
+
+from ocp_vscode import show
+from ocp_vscode.cache import leaves
+from ocp_vscode.dedup import _rotate, dedup_meshes
+
+from conftest import make_box, make_part
+
+BB = {"xmin": 0, "xmax": 10, "ymin": 0, "ymax": 10, "zmin": 0, "zmax": 10}
+
+
+def _mesh(offset=(0.0, 0.0, 0.0), size=1.0):
+    vertices = np.array(
+        [(0, 0, 0), (size, 0, 0), (0, size, 0), (0, 0, size)], dtype=np.float32
+    )
+    return {
+        "vertices": (vertices + np.float32(offset)).ravel(),
+        "normals": np.tile(np.float32((0, 0, 1)), 4),
+        "triangles": np.array([0, 1, 2, 0, 1, 3], dtype=np.uint32),
+        "edges": (vertices[:2] + np.float32(offset)).ravel(),
+    }
+
+
+def _leaf(name, shape, loc=None):
+    return {"id": f"/Group/{name}", "type": "shapes", "shape": shape, "loc": loc}
+
+
+def _world(mesh, loc):
+    vertices = np.asarray(mesh["vertices"], dtype=np.float64).reshape(-1, 3)
+    if loc is None:
+        return vertices
+    t, q = loc
+    return np.array([_rotate(v, q) for v in vertices]) + t
+
+
+def test_translated_meshes_are_stored_once():
+    instances = [_mesh(), _mesh((5.0, 0.0, 0.0))]
+    shapes = {
+        "parts": [
+            _leaf("a", {"ref": 0}),
+            _leaf("b", {"ref": 1}, ([0.0, 1.0, 0.0], [0.0, 0.0, 0.7071068, 0.7071068])),
+            _leaf("c", _mesh((2.0, 2.0, 2.0))),
+            _leaf("d", _mesh(size=2.0)),
+        ]
+    }
+
+    new_instances, new_shapes = dedup_meshes(instances, shapes, BB)
+
+    assert len(new_instances) == 2
+    refs = [leaf["shape"]["ref"] for leaf in new_shapes["parts"]]
+    assert refs == [0, 0, 0, 1]
+
+    # every leaf keeps its vertices in world coordinates
+    old = [instances[0], instances[1], shapes["parts"][2]["shape"]]
+    for leaf, mesh, new_leaf in zip(shapes["parts"], old, new_shapes["parts"]):
+        np.testing.assert_allclose(
+            _world(new_instances[new_leaf["shape"]["ref"]], new_leaf["loc"]),
+            _world(mesh, leaf["loc"]),
+            atol=1e-5,
+        )
+
+
+def test_inputs_are_not_changed():
+    instances = [_mesh(), _mesh((5.0, 0.0, 0.0))]
+    shapes = {"parts": [_leaf("a", {"ref": 0}), _leaf("b", {"ref": 1})]}
+
+    dedup_meshes(instances, shapes, BB)
+
+    assert [leaf["shape"] for leaf in shapes["parts"]] == [{"ref": 0}, {"ref": 1}]
+    assert shapes["parts"][1]["loc"] is None
+    assert instances[1]["vertices"][0] == 5.0
+
+
+def test_show_sends_copies_once():
+    part = make_part()
+    copy = BRepBuilderAPI_Copy(part).Shape()
+    payload = show(part, copy, make_box(), progress=None)
+
+    instances = payload["data"]["instances"]
+    refs = [leaf["shape"]["ref"] for leaf in leaves(payload["data"]["shapes"])]
+    assert len(instances) == 2
+    assert refs[0] == refs[1] != refs[2]
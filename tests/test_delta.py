@@ -0,0 +1,94 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+
+from ocp_vscode import Serializer, apply_delta, reset_delta, show
+
+from conftest import make_box, make_part
+
+
+def _show(serializer, *objs, **kwargs):
+    return serializer.show(*objs, names=["part", "box"][: len(objs)], **kwargs)
+
+
+def test_first_payload_is_full():
+    payload = _show(Serializer(), make_part(), make_box(), delta=True, progress=None)
+    assert payload["type"] == "data"
+    assert payload["seq"] == 1
+    assert apply_delta(None, payload) is payload
+
+
+@pytest.mark.parametrize(
+    "objs",
+    [
+        lambda: [make_part(), make_box()],  # unchanged
+        lambda: [make_part(2.0), make_box()],  # changed
+        lambda: [make_part()],  # removed
+        lambda: [make_part(), make_box(2, 2, 2)],  # changed, not first
+    ],
+)
+def test_round_trip(objs):
+    serializer = Serializer()
+    previous = _show(serializer, make_part(), make_box(), delta=True, progress=None)
+
+    message = _show(serializer, *objs(), delta=True, progress=None)
+    assert message["type"] == "delta"
+    assert message["base"] == previous["seq"]
+
+    expected = _show(Serializer(), *objs(), progress=None)
+    assert apply_delta(previous, message)["data"] == expected["data"]
+
+
+def test_unchanged_delta_is_empty():
+    serializer = Serializer()
+    _show(serializer, make_part(), make_box(), delta=True, progress=None)
+    delta = _show(serializer, make_part(), make_box(), delta=True, progress=None)
+
+    assert delta["data"]["instances"]["changed"] == {}
+    assert delta["data"]["parts"] == {"added": {}, "changed": {}, "removed": []}
+    assert delta["data"]["tree"] is None
+    assert delta["data"]["states"] == {"changed": {}, "removed": []}
+
+
+def test_added_part():
+    serializer = Serializer()
+    previous = _show(serializer, make_part(), delta=True, progress=None)
+    message = _show(serializer, make_part(), make_box(), delta=True, progress=None)
+
+    assert list(message["data"]["parts"]["added"]) == ["/Group/box"]
+    assert message["data"]["tree"] is not None
+
+    expected = _show(Serializer(), make_part(), make_box(), progress=None)
+    assert apply_delta(previous, message)["data"] == expected["data"]
+
+
+def test_wrong_base():
+    serializer = Serializer()
+    first = _show(serializer, make_part(), delta=True, progress=None)
+    _show(serializer, make_part(2.0), delta=True, progress=None)
+    third = _show(serializer, make_part(3.0), delta=True, progress=None)
+
+    with pytest.raises(ValueError):
+        apply_delta(first, third)
+
+
+def test_reset_delta():
+    show(make_part(), delta=True, progress=None)
+    assert show(make_part(), delta=True, progress=None)["type"] == "delta"
+
+    reset_delta()
+    assert show(make_part(), delta=True, progress=None)["type"] == "data"
@@ -0,0 +1,60 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ocp_vscode import show, show_object
+from ocp_vscode.cache import leaves
+
+from conftest import make_box, make_part
+
+
+def _parts(payload):
+    """(id, mesh, loc) of every leaf of the payload"""
+    instances = payload["data"]["instances"]
+    return [
+        (leaf["id"], instances[leaf["shape"]["ref"]], leaf["loc"])
+        for leaf in leaves(payload["data"]["shapes"])
+    ]
+
+
+def test_incremental_equals_show():
+    objs = [make_part(), make_part(2.0), make_box(), make_part(3.0)]
+    for obj in objs:
+        payload = show_object(obj, incremental=True, progress=None)
+    full = show(*objs, progress=None)
+
+    parts = _parts(payload)
+    ids = [part[0] for part in parts]
+    assert ids == [
+        "/Group/Solid",
+        "/Group/Solid(2)",
+        "/Group/Solid(3)",
+        "/Group/Solid(4)",
+    ]
+    assert parts == _parts(full)
+    assert payload["data"]["states"] == full["data"]["states"]
+
+
+def test_names_stay_unique():
+    show_object(make_box(), name="box", incremental=True, progress=None)
+    show_object(make_box(2), name="box", incremental=True, progress=None)
+    payload = show_object(
+        make_part(), name="part", parent=make_box(), incremental=True, progress=None
+    )
+    payload = show_object(make_box(3), name="box", incremental=True, progress=None)
+
+    ids = [leaf["id"] for leaf in leaves(payload["data"]["shapes"])]
+    assert len(set(ids)) == len(ids) == 5
+    assert len(payload["data"]["states"]) == 5
@@ -0,0 +1,78 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+
+from ocp_vscode import show
+from ocp_vscode.binary import decode_binary
+from ocp_vscode.cache import leaves
+from ocp_vscode.lazy import LazyScene
+
+from conftest import make_box, make_part
+
+
+def _mesh(message, leaf):
+    # parts are instances, their meshes are sent under "instances"
+    return message["data"]["instances"][str(leaf["shape"]["ref"])]
+
+
+def test_payload_without_meshes():
+    scene = show(make_part(), make_box(), lazy=True, progress=None)
+    assert isinstance(scene, LazyScene)
+    assert scene.data["lazy"]
+
+    parts = list(leaves(scene.data["data"]["shapes"]))
+    assert len(parts) == 2
+    for leaf in parts:
+        assert leaf["shape"] is None
+        assert leaf["id"] in scene.ids()
+        assert leaf["bb"]["xmax"] >= leaf["bb"]["xmin"]
+
+    bb = scene.data["data"]["shapes"]["bb"]
+    assert bb["zmax"] == pytest.approx(3.0, abs=1e-3)
+
+
+def test_part_matches_show():
+    part = make_part()
+    payload = show(part, progress=None)
+    scene = show(part, lazy=True, progress=None)
+
+    leaf = next(leaves(payload["data"]["shapes"]))
+    message = scene.part(leaf["id"])
+    assert message["type"] == "lazy_part"
+    assert message["id"] == leaf["id"]
+
+    mesh = payload["data"]["instances"][leaf["shape"]["ref"]]
+    lazy_mesh = _mesh(message, next(leaves(message["data"]["shapes"])))
+    for key in ("vertices", "triangles", "normals", "edges"):
+        assert lazy_mesh[key] == mesh[key]
+
+
+def test_group_and_binary_format():
+    scene = show(make_part(), make_box(), lazy=True, format="binary", progress=None)
+    group = decode_binary(scene.data)["data"]["shapes"]["id"]
+
+    message = decode_binary(scene.part(group))
+    parts = list(leaves(message["data"]["shapes"]))
+    assert len(parts) == 2
+    assert all(_mesh(message, leaf)["vertices"].size > 0 for leaf in parts)
+
+
+def test_invalid_combinations():
+    with pytest.raises(ValueError):
+        show(make_part(), lazy=True, stream=True, progress=None)
+    with pytest.raises(ValueError):
+        show(make_part(), lazy=True, format="archive", progress=None)
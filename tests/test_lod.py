@@ -0,0 +1,64 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+from ocp_tessellate.tessellator import cache as tessellator_cache
+
+from ocp_vscode import clear_cache, get_cache_info, show
+
+from conftest import make_box, make_part
+
+# a large angular tolerance, so that the deviation decides the mesh size
+PARAMS = {"angular_tolerance": 1.0, "progress": None}
+
+
+def _triangles(instances):
+    return sum(len(mesh["triangles"]) for mesh in instances if mesh is not None)
+
+
+def test_tiers_coarse_to_fine():
+    parts = [make_part(), make_part(5.0), make_box()]
+    payload = show(*parts, lod=[0.01, 1.0, 0.1], **PARAMS)
+
+    tiers = payload["data"]["lod"]
+    assert [tier["deviation"] for tier in tiers] == [1.0, 0.1]
+    assert all(len(tier["instances"]) == 3 for tier in tiers)
+
+    triangles = [_triangles(tier["instances"]) for tier in tiers]
+    triangles.append(_triangles(payload["data"]["instances"]))
+    assert triangles[0] < triangles[1] < triangles[2]
+
+    # the finest tier is the mesh of show() without lod
+    clear_cache()
+    plain = show(*parts, deviation=0.01, **PARAMS)
+    assert payload["data"]["instances"] == plain["data"]["instances"]
+    assert payload["data"]["shapes"] == plain["data"]["shapes"]
+
+
+def test_tiers_are_cached_by_content():
+    first = show(make_part(), lod=[1.0, 0.1], **PARAMS)
+    misses = get_cache_info()["misses"]
+
+    # equal shape, different object
+    second = show(make_part(), lod=[1.0, 0.1], **PARAMS)
+    assert get_cache_info()["misses"] == misses
+    assert first == second
+    assert len(tessellator_cache) == 0
+
+
+def test_invalid_lod():
+    with pytest.raises(ValueError):
+        show(make_part(), lod=[], progress=None)
@@ -0,0 +1,113 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import sys
+import threading
+
+import ocp_tessellate.mp_tessellator as mp
+import pytest
+from ocp_tessellate.tessellator import cache as tessellator_cache
+
+from ocp_vscode import (
+    Serializer,
+    clear_cache,
+    get_cache_info,
+    get_pool_info,
+    show,
+    shutdown_pool,
+    start_pool,
+)
+
+from conftest import make_box, make_part
+
+# ocp_vscode.show is the function of the same name
+show_module = sys.modules["ocp_vscode.show"]
+
+
+@pytest.fixture
+def pool():
+    start_pool(2)
+    yield
+    shutdown_pool()
+
+
+def _meshes(payload):
+    return payload["data"]["instances"]
+
+
+def test_parallel_equals_serial(pool):
+    parts = [make_part(size) for size in (1.0, 2.0, 3.0)] + [make_box()]
+    serial = show(*parts, progress=None)
+
+    clear_cache()
+    parallel = show(*parts, parallel=True, progress=None)
+
+    assert _meshes(parallel) == _meshes(serial)
+    assert parallel["data"]["shapes"] == serial["data"]["shapes"]
+
+
+def test_pool_across_runs(pool):
+    starts = get_pool_info()["starts"]
+
+    for size in (1.0, 2.0, 3.0):
+        show(make_part(size), make_box(size), parallel=True, progress=None)
+        assert get_pool_info()["running"]
+        assert not mp.keymap.map
+
+    # the workers outlive the shapes, nothing is cached by id()
+    assert len(tessellator_cache) == 0
+
+    # the pool is kept across show() calls
+    assert get_pool_info()["starts"] == starts
+
+
+def test_pool_uses_the_tessellation_cache(pool):
+    show(make_part(), make_part(), make_box(), parallel=True, progress=None)
+    # equal shapes are meshed once
+    assert get_cache_info()["misses"] == 2
+
+    # equal shapes of later calls are taken from the cache
+    show(make_part(), make_box(), make_box(2), parallel=True, progress=None)
+    assert get_cache_info()["misses"] == 3
+    assert get_cache_info()["hits"] == 2
+
+
+def test_other_sessions_run_while_the_pool_meshes(pool, monkeypatch):
+    wait_results = show_module.wait_results
+    other = {}
+
+    def wait_and_show(tasks):
+        # without the OCP lock released this thread would block forever
+        thread = threading.Thread(
+            target=lambda: other.update(
+                data=Serializer().show(make_box(4, 5, 6), progress=None)
+            )
+        )
+        thread.start()
+        thread.join(60)
+        assert not thread.is_alive()
+        wait_results(tasks)
+
+    parts = [make_part(size) for size in (1.0, 2.0)]
+    serial = show(*parts, progress=None)
+    clear_cache()
+
+    monkeypatch.setattr(show_module, "wait_results", wait_and_show)
+    parallel = show(*parts, parallel=True, progress=None)
+
+    assert "data" in other
+    assert _meshes(parallel) == _meshes(serial)
+    assert parallel["data"]["shapes"] == serial["data"]["shapes"]
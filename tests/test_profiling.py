@@ -0,0 +1,112 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import asyncio
+import threading
+
+from ocp_vscode import (
+    Serializer,
+    SpanCollector,
+    async_show,
+    collect,
+    enable_metrics,
+    get_metrics,
+    show,
+    show_batch,
+)
+from ocp_vscode.profiling import Timer
+
+from conftest import make_box, make_part
+
+
+def _names(collector):
+    return [span["name"] for span in collector.spans]
+
+
+def test_show_collector():
+    collector = SpanCollector()
+    show(make_part(), collector=collector, progress=None)
+
+    names = _names(collector)
+    assert "overall" in names and "tessellate" in names
+    overall = next(s for s in collector.spans if s["name"] == "overall")
+    assert overall["parent"] is None
+    assert all(s["parent"] is not None for s in collector.spans if s is not overall)
+
+
+def test_collectors_of_concurrent_threads():
+    barrier = threading.Barrier(2)
+    collectors = [SpanCollector(), SpanCollector()]
+    threads = {}
+
+    def run(index):
+        threads[index] = threading.get_ident()
+        with collect(collectors[index]):
+            for i in range(20):
+                # both threads are inside their collect() block at the same time
+                if i == 0:
+                    barrier.wait()
+                with Timer(False, f"thread {index}", "step"):
+                    pass
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    for index, collector in enumerate(collectors):
+        assert len(collector.spans) == 20
+        assert {span["thread"] for span in collector.spans} == {threads[index]}
+        assert {span["object"] for span in collector.spans} == {f"thread {index}"}
+
+
+def test_no_spans_outside_of_collect():
+    collector = SpanCollector()
+    with collect(collector):
+        pass
+    show(make_box(), progress=None)
+    assert collector.spans == []
+
+
+def test_async_show_and_batch_keep_the_collector():
+    collector = SpanCollector()
+
+    async def main():
+        with collect(collector):
+            await async_show(make_part(), progress=None, executor=None)
+
+    asyncio.run(main())
+    assert _names(collector).count("overall") == 1
+
+    collector.clear()
+    with collect(collector):
+        results = list(show_batch([make_part(), make_box()], workers=2))
+    assert all(result.error is None for result in results)
+    assert _names(collector).count("overall") == 2
+
+
+def test_metrics_get_all_threads():
+    enable_metrics(reset=True)
+    try:
+        thread = threading.Thread(
+            target=lambda: Serializer().show(make_box(), progress=None)
+        )
+        thread.start()
+        thread.join()
+        assert 'stage="overall"' in get_metrics()
+    finally:
+        enable_metrics(False, reset=True)
@@ -0,0 +1,115 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+import pytest
+
+from ocp_vscode import show
+from ocp_vscode.quantize import (
+    POSITION_MAX,
+    decode_normals,
+    dequantize_mesh,
+    encode_normals,
+    quantize_mesh,
+)
+
+from conftest import make_part
+
+RNG = np.random.default_rng(42)
+
+
+def _mesh(count=1000, size=(10.0, 0.5, 200.0)):
+    vertices = RNG.uniform(-1.0, 1.0, (count, 3)) * size + (5.0, -3.0, 0.0)
+    normals = RNG.normal(size=(count, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    return {
+        "vertices": vertices.astype(np.float32).ravel(),
+        "normals": normals.astype(np.float32).ravel(),
+        "triangles": np.arange(count - count % 3, dtype=np.uint32),
+        "edges": vertices[:100].astype(np.float32).ravel(),
+    }
+
+
+def _angles(a, b):
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 3)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 3)
+    cos = np.sum(a * b, axis=1) / np.linalg.norm(a, axis=1) / np.linalg.norm(b, axis=1)
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+def test_position_error_bound():
+    mesh = _mesh()
+    quantized = quantize_mesh(mesh)
+    assert quantized["vertices"].dtype == np.uint16
+    assert quantized["edges"].dtype == np.uint16
+
+    decoded = dequantize_mesh(quantized)
+    # half a quantization step plus the float32 rounding of the result
+    bound = np.asarray(quantized["quantization"]["scale"]) / 2 + 1e-5
+    for key in ("vertices", "edges"):
+        error = np.abs(decoded[key].reshape(-1, 3) - mesh[key].reshape(-1, 3))
+        assert np.all(error <= bound)
+
+
+def test_extremes_and_flat_meshes():
+    mesh = _mesh()
+    mesh["vertices"].reshape(-1, 3)[:, 1] = 1.5  # flat in y
+    mesh["edges"] = mesh["vertices"][:300].copy()
+    quantized = quantize_mesh(mesh)
+    vertices = quantized["vertices"].reshape(-1, 3)
+
+    assert vertices[:, 0].min() == 0 and vertices[:, 0].max() == POSITION_MAX
+    assert np.all(vertices[:, 1] == 0)
+    assert np.allclose(dequantize_mesh(quantized)["vertices"].reshape(-1, 3)[:, 1], 1.5)
+
+
+def test_normal_error_bound():
+    normals = _mesh(100_000)["normals"]
+    encoded = encode_normals(normals)
+    assert encoded.dtype == np.int8
+    assert encoded.size == normals.size // 3 * 2
+
+    angles = _angles(decode_normals(encoded), normals)
+    assert angles.max() < 1.0
+    assert angles.mean() < 0.5
+
+
+@pytest.mark.parametrize(
+    "normal",
+    [(0, 0, 1), (0, 0, -1), (1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0)],
+)
+def test_axis_normals(normal):
+    decoded = decode_normals(encode_normals(np.array(normal, dtype=np.float32)))
+    np.testing.assert_allclose(decoded, normal, atol=1e-6)
+
+
+def test_quantize_does_not_change_the_mesh():
+    mesh = _mesh()
+    vertices = mesh["vertices"].copy()
+    quantized = quantize_mesh(mesh)
+
+    np.testing.assert_array_equal(mesh["vertices"], vertices)
+    assert quantized["triangles"] is mesh["triangles"]
+    assert "quantization" not in mesh
+
+
+def test_show_quantize():
+    payload = show(make_part(), quantize=True, progress=None)
+    assert payload["config"]["quantize"]
+    for instance in payload["data"]["instances"]:
+        assert instance["quantization"]["normals"] == "oct8"
+        assert instance["vertices"]["dtype"] == "uint16"
+        assert instance["normals"]["dtype"] == "int8"
@@ -0,0 +1,74 @@
+#
+# Copyright 2023 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import io
+import socket
+
+import orjson
+import pytest
+
+from ocp_vscode import show
+from ocp_vscode.stream import assemble_stream
+
+from conftest import make_box, make_part
+
+
+def _objs():
+    return [make_part(), make_box()]
+
+
+@pytest.mark.parametrize("format", ["json", "binary", "archive"])
+def test_file_equals_show(tmp_path, format):
+    expected = show(*_objs(), format=format, progress=None)
+    if format == "json":
+        expected = orjson.dumps(expected)
+
+    path = tmp_path / "scene"
+    assert show(*_objs(), format=format, out=path, progress=None) is None
+    assert path.read_bytes() == expected
+
+
+def test_file_object_and_socket():
+    expected = orjson.dumps(show(*_objs(), progress=None))
+
+    buffer = io.BytesIO()
+    show(*_objs(), out=buffer, progress=None)
+    assert buffer.getvalue() == expected
+
+    reader, writer = socket.socketpair()
+    try:
+        show(*_objs(), out=writer, progress=None)
+        writer.close()
+        received = b"".join(iter(lambda: reader.recv(65536), b""))
+    finally:
+        reader.close()
+    assert received == expected
+
+
+def test_stream_as_json_lines(tmp_path):
+    path = tmp_path / "scene.jsonl"
+    show(*_objs(), stream=True, out=path, progress=None)
+
+    with open(path, "rb") as fd:
+        assembled = assemble_stream(orjson.loads(line) for line in fd)
+    expected = assemble_stream(show(*_objs(), stream=True, progress=None))
+    # tuples become lists in JSON
+    assert assembled == orjson.loads(orjson.dumps(expected))
+
+
+def test_stream_needs_json(tmp_path):
+    with pytest.raises(ValueError):
+        show(*_objs(), stream=True, format="binary", out=tmp_path / "x", progress=None)